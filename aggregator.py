@@ -0,0 +1,214 @@
+"""
+Fan-out aggregator: polls WMATA once per station or stop and publishes the
+predictions to every subscribed sign on the LAN as compact binary frames.
+
+Runs on a normal Linux host from the repository root, next to a
+wifiandapikey.txt holding the WMATA API key (config.py reads it):
+
+    python aggregator.py [--port 9595] [--api-base URL]
+
+Signs with config['aggregator_host'] set subscribe to channels named after
+their own configuration (frame.metro_channel / frame.bus_channel). A channel
+is polled with the same MetroApi/BusApi code, caching and adaptive poll
+interval the signs use, for as long as it has subscribers. Changes go out as
+DELTA frames, with a FULL frame to new subscribers and every
+--keyframe-interval seconds so signs that missed a datagram catch up.
+See frame.py for the frame layout.
+"""
+import argparse
+import select
+import socket
+import ssl
+import time
+
+import frame
+import log
+import transport
+from bus_api import BusApi
+from bus_api import MetroApiOnFireException as BusApiOnFireException
+from config import config
+from countdown import poll_interval
+from metro_api import MetroApi, MetroApiOnFireException
+
+
+class Channel:
+    """The predictions, frame sequence and subscribers of one channel."""
+    def __init__(self, name: bytes, fetch):
+        self.name = name
+        self.fetch = fetch
+
+        self.predictions = None
+        self.records = []
+        self.sequence = 0
+        self.full_frame = None
+        self.full_sent_at = 0.0
+        self.next_poll = 0.0
+        # Whether the last fetch failed; keyframes stop so signs notice.
+        self.failing = False
+
+        # Subscriber address -> monotonic time the subscription expires.
+        self.subscribers = {}
+
+    def poll(self, now: float):
+        """Fetches the channel and returns a frame to publish, or None if nothing changed."""
+        try:
+            predictions = self.fetch()
+            self.failing = False
+        except (MetroApiOnFireException, BusApiOnFireException):
+            log.warning(f'WMATA is unavailable for {self.name.decode()}. Keeping the last frame.')
+            predictions = None
+            self.failing = True
+        self.next_poll = now + poll_interval(predictions if predictions is not None else self.predictions)
+        if predictions is None or predictions is self.predictions:
+            return None
+        self.predictions = predictions
+
+        records = [frame.encode_record(prediction) for prediction in predictions]
+        if records == self.records:
+            return None
+
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        delta = None
+        if self.full_frame is not None:
+            delta = frame.encode_delta(self.name, self.sequence, self.records, records)
+        self.records = records
+        self.full_frame = frame.encode_full(self.name, self.sequence, records)
+        if delta is None:
+            self.full_sent_at = now
+            return self.full_frame
+        return delta
+
+    def keyframe(self, now: float, interval: float):
+        """Returns a FULL frame if none was published for `interval` seconds, otherwise None."""
+        if self.full_frame is None or self.failing or now - self.full_sent_at < interval:
+            return None
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        self.full_frame = frame.encode_full(self.name, self.sequence, self.records)
+        self.full_sent_at = now
+        return self.full_frame
+
+
+def channel_fetcher(name: bytes):
+    """
+    Returns the function fetching the predictions of channel `name`,
+    or None if the name is not a metro or bus channel.
+    """
+    parts = name.decode('utf-8', 'replace').split(':')
+    if len(parts) != 3 or not parts[1] or not parts[2]:
+        return None
+    kind, codes, option = parts
+    codes = codes.split(',')
+    if kind == 'metro':
+        return lambda: MetroApi.fetch_train_predictions(codes, option)
+    if kind == 'bus':
+        return lambda: BusApi.fetch_bus_predictions(codes, option)
+    return None
+
+
+class Aggregator:
+    """Serves channels to subscribers over a bound UDP socket."""
+    def __init__(self, sock, keyframe_interval: float, max_channels: int):
+        self.socket = sock
+        self.keyframe_interval = keyframe_interval
+        self.max_channels = max_channels
+        self.channels = {}
+
+        # Datagrams and bytes sent to subscribers, and WMATA polls made.
+        self.datagrams = 0
+        self.bytes_sent = 0
+        self.polls = 0
+
+    def handle(self, data: bytes, address, now: float):
+        """Handles a datagram from a sign."""
+        header = frame.decode_header(data)
+        if header is None or header[0] != frame.SUBSCRIBE:
+            return
+        name = header[1]
+
+        channel = self.channels.get(name)
+        if channel is None:
+            fetch = channel_fetcher(name)
+            if fetch is None or len(self.channels) >= self.max_channels:
+                log.warning(f'Refusing subscription to {name!r} from {address}.')
+                return
+            channel = self.channels[name] = Channel(name, fetch)
+            log.info(f'New channel {name.decode()}.')
+
+        if address not in channel.subscribers:
+            log.info(f'{address} subscribed to {name.decode()}.')
+        channel.subscribers[address] = now + frame.SUBSCRIPTION_TTL
+        if channel.full_frame is not None:
+            self._send(channel.full_frame, address)
+
+    def step(self, now: float):
+        """Polls channels that are due, publishes their frames and drops idle channels."""
+        for name in list(self.channels):
+            channel = self.channels[name]
+            for address in [a for a, expires in channel.subscribers.items() if expires < now]:
+                del channel.subscribers[address]
+                log.info(f'{address} unsubscribed from {name.decode()}.')
+            if not channel.subscribers:
+                del self.channels[name]
+                log.info(f'Channel {name.decode()} has no subscribers left.')
+                continue
+
+            data = None
+            if now >= channel.next_poll:
+                self.polls += 1
+                data = channel.poll(now)
+            if data is None:
+                data = channel.keyframe(now, self.keyframe_interval)
+            if data is not None:
+                for address in channel.subscribers:
+                    self._send(data, address)
+
+    def timeout(self, now: float) -> float:
+        """Returns how long to wait for datagrams before the next channel is due."""
+        due = [channel.next_poll for channel in self.channels.values()]
+        due += [channel.full_sent_at + self.keyframe_interval for channel in self.channels.values() if channel.full_frame and not channel.failing]
+        return max(0.0, min(due) - now) if due else 1.0
+
+    def serve_forever(self):
+        while True:
+            readable, _, _ = select.select([self.socket], [], [], self.timeout(time.monotonic()))
+            if readable:
+                try:
+                    data, address = self.socket.recvfrom(frame.frame_size(0))
+                except OSError:
+                    continue
+                self.handle(data, address, time.monotonic())
+            self.step(time.monotonic())
+
+    def _send(self, data: bytes, address):
+        try:
+            self.socket.sendto(data, address)
+            self.datagrams += 1
+            self.bytes_sent += len(data)
+        except OSError as e:
+            log.warning(f'Failed to send a frame to {address}. Error: {e}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bind', default='0.0.0.0', help='address to listen on')
+    parser.add_argument('--port', type=int, default=config['aggregator_port'], help='UDP port to listen on')
+    parser.add_argument('--keyframe-interval', type=float, default=30, help='seconds between FULL frames')
+    parser.add_argument('--max-channels', type=int, default=32, help='most channels polled at once')
+    parser.add_argument('--api-base', help='scheme and host to use instead of https://api.wmata.com, e.g. for a test server')
+    args = parser.parse_args()
+
+    if args.api_base:
+        for key in ('metro_api_url', 'bus_api_url'):
+            config[key] = args.api_base.rstrip('/') + config[key][config[key].index('/', len('https://')):]
+
+    # Requests go through the same Transport as on a sign, over the host's sockets.
+    transport._transport = transport.Transport(socket, ssl.create_default_context())
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((args.bind, args.port))
+    log.info(f'Aggregator listening on {args.bind}:{args.port}.')
+    Aggregator(sock, args.keyframe_interval, args.max_channels).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
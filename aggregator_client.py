@@ -0,0 +1,108 @@
+import time
+
+import frame
+import log
+from prediction import Prediction
+from settings import settings
+
+
+class AggregatorClient:
+    """
+    Receives one channel of predictions from an aggregator (aggregator.py)
+    instead of polling WMATA.
+
+    open_socket is a function returning a non-blocking UDP socket connected to
+    the aggregator; it is called on the first poll so WiFi is only brought up
+    then. The subscription is renewed well within frame.SUBSCRIPTION_TTL, and
+    a DELTA frame that does not follow the last frame received resubscribes,
+    which makes the aggregator send a FULL frame.
+
+    Datagrams are received into one preallocated buffer sized for
+    settings.num_trains predictions.
+    """
+    def __init__(self, open_socket, channel: bytes, timeout: float):
+        self._open_socket = open_socket
+        self._socket = None
+        self._started_at = None
+        self.channel = channel
+        self.timeout = timeout
+
+        self._buffer = bytearray(frame.frame_size(settings.num_trains))
+        self._view = memoryview(self._buffer)
+        self._subscribe = frame.encode_subscribe(channel)
+        self._subscribed_at = None
+
+        self.predictions = None
+        self._sequence = 0
+        self._received_at = None
+
+        # Frames applied, and resubscriptions after a missed or truncated frame.
+        self.frames = 0
+        self.resyncs = 0
+
+    def poll(self) -> list[Prediction]:
+        """
+        Applies every frame received since the last poll.
+        Returns the latest predictions (the same list object while nothing
+        changed), or None if no frame arrived within `timeout` seconds.
+        """
+        now = time.monotonic()
+        if self._socket is None:
+            self._socket = self._open_socket()
+            self._started_at = now
+        renew = frame.SUBSCRIBE_RETRY if self._received_at is None else frame.SUBSCRIPTION_TTL / 2
+        if self._subscribed_at is None or now - self._subscribed_at >= renew:
+            self._send_subscribe(now)
+
+        while True:
+            try:
+                size = self._socket.recv_into(self._buffer)
+            except OSError:
+                # Nothing waiting on a non-blocking socket.
+                break
+            if not size:
+                break
+            self._handle(self._view[:size], now)
+
+        if self._received_at is None or now - self._received_at > self.timeout:
+            return None
+        return self.predictions
+
+    def waiting(self) -> bool:
+        """Whether the first frame is still expected, so an empty poll() is not an outage yet."""
+        return self._received_at is None and (self._started_at is None or time.monotonic() - self._started_at <= self.timeout)
+
+    def confirmed_at(self) -> float:
+        """
+        Returns the monotonic time the latest predictions were last confirmed:
+        when the last frame arrived, a keyframe included, or None before the first.
+        """
+        return self._received_at
+
+    def _send_subscribe(self, now: float):
+        try:
+            self._socket.send(self._subscribe)
+            self._subscribed_at = now
+        except OSError as e:
+            log.warning(f'Failed to subscribe to aggregator. Error: {e}')
+
+    def _handle(self, data, now: float):
+        header = frame.decode_header(data)
+        if header is None or header[1] != self.channel or header[0] == frame.SUBSCRIBE:
+            return
+
+        try:
+            predictions = frame.apply_frame(data, header, self.predictions, self._sequence)
+        except (ValueError, IndexError):
+            # A corrupted record (a UnicodeError is a ValueError) is as bad as a missed frame.
+            predictions = None
+        if predictions is None:
+            self.resyncs += 1
+            log.debug('Missed an aggregator frame. Asking for a full frame.')
+            self._send_subscribe(now)
+            return
+
+        self.predictions = predictions
+        self._sequence = header[2]
+        self._received_at = now
+        self.frames += 1
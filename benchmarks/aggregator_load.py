@@ -0,0 +1,191 @@
+"""
+Load test for the fan-out aggregator (aggregator.py).
+
+Runs on a host from the repository root:
+
+    python benchmarks/aggregator_load.py [--subscribers N] [--seconds S]
+
+Starts a local fake WMATA HTTP server that replays the recorded responses in
+benchmarks/fixtures, counting down their arrival minutes every
+--change-every requests so frames keep changing. An aggregator is pointed at
+it, and N simulated signs (AggregatorClient on real UDP sockets) subscribe to
+a mix of metro and bus channels and poll it like code.py does.
+
+The report compares the WMATA requests made with what N independently polling
+signs would need, and shows datagram sizes, fan-out time, frames applied and
+resyncs, and checks that a sign sent a garbled frame resubscribes.
+adafruit_requests and adafruit_json_stream are pure Python and must be
+installed (pip install adafruit-circuitpython-requests
+adafruit-circuitpython-json-stream).
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from harness import install_standins, load_fixture
+
+CHANNELS = (b'metro:A01:1', b'metro:A01,C01:*', b'bus:1001344:0')
+
+
+class FakeWmata(BaseHTTPRequestHandler):
+    """Answers prediction requests with a fixture whose minutes count down."""
+    protocol_version = 'HTTP/1.1'
+    requests = 0
+    change_every = 1
+    stations = json.loads(load_fixture('station_busy.json'))
+    stop = json.loads(load_fixture('bus_stop.json'))
+
+    def do_GET(self):
+        FakeWmata.requests += 1
+        elapsed = FakeWmata.requests // FakeWmata.change_every
+        if self.path.startswith('/StationPrediction.svc/'):
+            trains = []
+            for train in FakeWmata.stations['Trains']:
+                train = dict(train)
+                if train['Min'].isdigit():
+                    minutes = (int(train['Min']) - elapsed) % 30
+                    train['Min'] = str(minutes) if minutes else 'ARR'
+                trains.append(train)
+            body = json.dumps({'Trains': trains})
+        else:
+            predictions = []
+            for prediction in FakeWmata.stop['Predictions']:
+                prediction = dict(prediction)
+                prediction['Minutes'] = (prediction['Minutes'] - elapsed) % 30
+                predictions.append(prediction)
+            body = json.dumps(dict(FakeWmata.stop, Predictions=predictions))
+
+        body = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=200, help='simulated signs')
+    parser.add_argument('--seconds', type=float, default=20, help='length of the run')
+    parser.add_argument('--poll', type=float, default=1, help='seconds between WMATA polls for each channel')
+    parser.add_argument('--change-every', type=int, default=3, help='WMATA requests between minute changes')
+    args = parser.parse_args()
+
+    install_standins()
+
+    import builtins
+    import frame
+    import transport
+    from aggregator import Aggregator
+    from aggregator_client import AggregatorClient
+    from config import config
+    from response_cache import response_cache
+
+    FakeWmata.change_every = args.change_every
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeWmata)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    config['metro_api_url'] = base + '/StationPrediction.svc/json/GetPrediction/'
+    config['bus_api_url'] = base + '/NextBusService.svc/json/jPredictions?StopID='
+    for key in ('refresh_interval', 'refresh_interval_fast', 'refresh_interval_slow', 'refresh_interval_idle'):
+        config[key] = args.poll
+    response_cache.ttl = 0
+    transport._transport = transport.Transport(socket)
+
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_socket.bind(('127.0.0.1', 0))
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+    server_socket.setblocking(False)
+    aggregator = Aggregator(server_socket, keyframe_interval=args.seconds / 4, max_channels=len(CHANNELS))
+    address = server_socket.getsockname()
+
+    # Fan-out time of every step that published something.
+    fanout_times = []
+    sizes = {frame.FULL: [], frame.DELTA: []}
+    send = aggregator._send
+
+    def sized_send(data, to):
+        sizes[data[3]].append(len(data))
+        send(data, to)
+    aggregator._send = sized_send
+
+    def open_socket():
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 16)
+        sock.connect(address)
+        sock.setblocking(False)
+        return sock
+
+    # The APIs narrate every request; keep the report readable.
+    real_print = builtins.print
+    builtins.print = lambda *a, **k: None  # noqa: E731
+    clients = [AggregatorClient(open_socket, CHANNELS[i % len(CHANNELS)], args.seconds) for i in range(args.subscribers)]
+    try:
+        start = time.monotonic()
+        while time.monotonic() - start < args.seconds:
+            for client in clients:
+                client.poll()
+            while True:
+                try:
+                    data, sender = server_socket.recvfrom(frame.frame_size(0))
+                except BlockingIOError:
+                    break
+                aggregator.handle(data, sender, time.monotonic())
+
+            datagrams = aggregator.datagrams
+            step_start = time.perf_counter()
+            aggregator.step(time.monotonic())
+            if aggregator.datagrams != datagrams:
+                fanout_times.append(time.perf_counter() - step_start)
+            time.sleep(0.05)
+        for client in clients:
+            client.poll()
+    finally:
+        builtins.print = real_print
+        server.shutdown()
+
+    received = sum(client.frames for client in clients)
+    resyncs = sum(client.resyncs for client in clients)
+    current = sum(
+        1 for client in clients
+        if client.predictions is not None and
+        [frame.encode_record(prediction) for prediction in client.predictions] == aggregator.channels[client.channel].records
+    )
+
+    # A datagram garbled in a destination must only cost a resubscription.
+    client = clients[0]
+    garbled = bytearray(aggregator.channels[client.channel].full_frame)
+    garbled[-frame._DESTINATION_BYTES] = 0xFF
+    kept = client.predictions
+    resyncs_before = client.resyncs
+    server_socket.sendto(garbled, client._socket.getsockname())
+    time.sleep(0.05)
+    client.poll()
+    garbled_handled = client.resyncs == resyncs_before + 1 and client.predictions is kept
+
+    independent = args.subscribers * args.seconds / args.poll
+
+    print(f'{args.subscribers} subscribers on {len(CHANNELS)} channels for {args.seconds:.0f} s')
+    print(f'WMATA requests: {FakeWmata.requests} (about {independent:.0f} if every sign polled on its own)')
+    print(f'aggregator polls: {aggregator.polls}, datagrams sent: {aggregator.datagrams}, bytes sent: {aggregator.bytes_sent}')
+    for name, frame_type in (('full', frame.FULL), ('delta', frame.DELTA)):
+        if sizes[frame_type]:
+            print(f'{name} frames: {len(sizes[frame_type])}, {sum(sizes[frame_type]) / len(sizes[frame_type]):.0f} bytes average')
+    if fanout_times:
+        fanout_times.sort()
+        print(
+            f'fan-out per publishing step: {sum(fanout_times) / len(fanout_times) * 1000:.2f} ms average, '
+            f'{fanout_times[len(fanout_times) * 95 // 100] * 1000:.2f} ms p95 (includes the WMATA request)'
+        )
+    print(f'frames applied by signs: {received}, resyncs: {resyncs}, signs up to date: {current}/{args.subscribers}')
+    print(f'garbled frame: {"resubscribed, predictions kept" if garbled_handled else "NOT handled"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Host-side benchmark harness for MetroApi, BusApi, TrainBoard and BusBoard.
+
+Runs on a host from the repository root:
+
+    python benchmarks/harness.py [--refreshes N]
+
+The CircuitPython hardware modules (board, displayio, bitmaptools,
+adafruit_display_text, adafruit_matrixportal, adafruit_bitmap_font) are
+replaced by the stand-ins in benchmarks/standins, and the shared transport is
+replaced by one that replays the recorded WMATA responses in
+benchmarks/fixtures. adafruit_json_stream is pure Python and must be installed
+(pip install adafruit-circuitpython-json-stream).
+
+For every scenario each refresh is fetched, parsed, normalized and rendered,
+and the harness reports per-refresh latency, heap allocation (tracemalloc)
+and displayio writes. Switching between the train and bus boards and
+scrolling a long destination are timed and checked for allocations the same way.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+STANDIN_DIR = os.path.join(BENCHMARK_DIR, 'standins')
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, 'fixtures')
+
+
+def install_standins():
+    """
+    Puts the stand-in hardware modules ahead of everything on sys.path and runs
+    from a throwaway directory holding the wifiandapikey.txt config.py reads.
+    """
+    sys.path.insert(0, REPO_DIR)
+    sys.path.insert(0, STANDIN_DIR)
+
+    workdir = tempfile.mkdtemp(prefix='metrosign-bench-')
+    with open(os.path.join(workdir, 'wifiandapikey.txt'), 'w') as f:
+        json.dump({'ssid': 'bench', 'password': 'bench', 'api_key': 'bench'}, f)
+    os.chdir(workdir)
+
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+        return f.read()
+
+
+class FixtureResponse:
+    """Just enough of an adafruit_requests Response to replay a recorded body."""
+    def __init__(self, body: bytes):
+        self.status_code = 200
+        self.headers = {}
+        self._body = body
+        self._read = 0
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), len(self._body) - self._read)
+        buffer[:size] = self._body[self._read:self._read + size]
+        self._read += size
+        return size
+
+    def close(self):
+        pass
+
+
+class FixtureTransport:
+    """Stands in for transport.Transport, answering every request with `body`."""
+    def __init__(self):
+        self.body = b''
+        self.requests = 0
+
+    def get(self, url: str, headers: dict = None) -> FixtureResponse:
+        self.requests += 1
+        return FixtureResponse(self.body)
+
+
+class Scenario:
+    """A fixture replayed through one API call and rendered on the board."""
+    def __init__(self, name: str, fixture: str, fetch, keep_cache: bool = False):
+        self.name = name
+        self.fixture = fixture
+        self.fetch = fetch
+        # Keep cached results between refreshes to measure the unchanged-data path.
+        self.keep_cache = keep_cache
+
+
+def run_scenario(scenario: Scenario, refreshes: int, board, transport, response_cache, displayio) -> dict:
+    """Returns timing, allocation and display write figures for `refreshes` refreshes."""
+    import bus_api
+    import metro_api
+    from bus_api import MetroApiOnFireException as BusApiOnFireException
+    from metro_api import MetroApiOnFireException
+
+    # Each scenario starts with WMATA trusted again, whatever the last one did to the circuits.
+    metro_api._breaker.success()
+    bus_api._breaker.success()
+    transport.body = load_fixture(scenario.fixture)
+    response_cache.ttl = 0
+    response_cache.clear()
+
+    def refresh():
+        if not scenario.keep_cache:
+            response_cache.clear()
+        try:
+            data = scenario.fetch()
+            error = False
+        except (MetroApiOnFireException, BusApiOnFireException):
+            # Anything else escaping an API would stop the sign, so it stops the harness too.
+            data = None
+            error = True
+        fetched = time.perf_counter()
+        board.render(data)
+        return fetched, error
+
+    # Timing pass, without tracemalloc slowing things down.
+    fetch_times = []
+    render_times = []
+    writes = []
+    errors = 0
+    counters = response_cache.counters()
+    for _ in range(refreshes):
+        displayio.reset_write_count()
+        start = time.perf_counter()
+        fetched, error = refresh()
+        end = time.perf_counter()
+        fetch_times.append(fetched - start)
+        render_times.append(end - fetched)
+        writes.append(displayio.write_count)
+        errors += error
+    # What the response cache saved over the timing pass: requests not made,
+    # unchanged bodies not normalized, and results built.
+    cache = {name: count - counters[name] for name, count in response_cache.counters().items()}
+
+    # Allocation pass.
+    allocations = []
+    tracemalloc.start()
+    for _ in range(refreshes):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        refresh()
+        allocations.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        'fetch_ms': sum(fetch_times) / refreshes * 1000,
+        'fetch_max_ms': max(fetch_times) * 1000,
+        'render_ms': sum(render_times) / refreshes * 1000,
+        'peak_kib': sum(allocations) / refreshes / 1024,
+        'writes': sum(writes) / refreshes,
+        'errors': errors,
+        'cache': f'{cache["hits"]}/{cache["skips"]}/{cache["misses"]}',
+    }
+
+
+def measure_switches(boards: list, switches: int) -> dict:
+    """Returns timing and allocation figures for `switches` board switches."""
+    times = []
+    for i in range(switches):
+        start = time.perf_counter()
+        boards[i % len(boards)].show()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(switches):
+        boards[i % len(boards)].show()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    return {
+        'switch_ms': sum(times) / switches * 1000,
+        'switch_max_ms': max(times) * 1000,
+        'bytes': allocated,
+    }
+
+
+def measure_scroll(board, frames: int) -> dict:
+    """Returns timing and allocation figures for `frames` scroll frames of a long destination."""
+    from prediction import Prediction
+    board.render([Prediction(0xFF0000, 'Largo Town Center', '4', '8', False)])
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        board.scroll()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(frames):
+        board.scroll()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    return {'frame_ms': elapsed / frames * 1000, 'bytes': allocated}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--refreshes', type=int, default=50, help='refreshes per scenario')
+    args = parser.parse_args()
+
+    install_standins()
+
+    import builtins
+    import displayio
+    import transport
+    from adafruit_matrixportal.matrix import Matrix
+    from bus_api import BusApi
+    from bus_board import BusBoard
+    from metro_api import MetroApi
+    from response_cache import response_cache
+    from text_cache import text_cache
+    from train_board import TrainBoard
+
+    fixture_transport = FixtureTransport()
+    transport._transport = fixture_transport
+
+    scenarios = [
+        Scenario('metro small', 'station_small.json', lambda: MetroApi.fetch_train_predictions('A01', '1')),
+        Scenario('metro busy, group 1', 'station_busy.json', lambda: MetroApi.fetch_train_predictions('A01', '1')),
+        Scenario('metro busy, 2 stations', 'station_busy.json', lambda: MetroApi.fetch_train_predictions(['A01', 'C01'], '*')),
+        Scenario('metro busy, unchanged', 'station_busy.json', lambda: MetroApi.fetch_train_predictions('A01', '1'), keep_cache=True),
+        Scenario('metro malformed', 'station_malformed.json', lambda: MetroApi.fetch_train_predictions('A01', '1')),
+        Scenario('metro empty body', 'empty.json', lambda: MetroApi.fetch_train_predictions('A01', '1')),
+        Scenario('metro wrong shape', 'wrong_shape.json', lambda: MetroApi.fetch_train_predictions('A01', '1')),
+        Scenario('bus stop', 'bus_stop.json', lambda: BusApi.fetch_bus_predictions('1001344', '0')),
+        Scenario('bus stop, unchanged', 'bus_stop.json', lambda: BusApi.fetch_bus_predictions('1001344', '0'), keep_cache=True),
+        Scenario('bus empty body', 'empty.json', lambda: BusApi.fetch_bus_predictions('1001344', '0')),
+        Scenario('bus wrong shape', 'wrong_shape.json', lambda: BusApi.fetch_bus_predictions('1001344', '0')),
+    ]
+
+    # The APIs and board narrate every refresh; keep the report readable.
+    quiet = lambda *args, **kwargs: None  # noqa: E731
+    real_print = builtins.print
+    builtins.print = quiet
+    try:
+        display = Matrix().display
+        board = TrainBoard(display)
+        bus_board = BusBoard(display)
+        results = [(scenario, run_scenario(scenario, args.refreshes, board, fixture_transport, response_cache, displayio)) for scenario in scenarios]
+        switches = measure_switches([board, bus_board], args.refreshes)
+        scroll = measure_scroll(board, args.refreshes)
+    finally:
+        builtins.print = real_print
+
+    print(f'{args.refreshes} refreshes per scenario')
+    print(f'{"scenario":<26} {"fetch ms":>9} {"max ms":>8} {"render ms":>10} {"peak KiB":>9} {"writes":>7} {"errors":>7} {"hit/skip/miss":>14}')
+    for scenario, result in results:
+        print(
+            f'{scenario.name:<26} {result["fetch_ms"]:>9.3f} {result["fetch_max_ms"]:>8.3f} '
+            f'{result["render_ms"]:>10.3f} {result["peak_kib"]:>9.1f} {result["writes"]:>7.1f} {result["errors"]:>7} {result["cache"]:>14}'
+        )
+    print(
+        f'board switch: {switches["switch_ms"]:.4f} ms average, {switches["switch_max_ms"]:.4f} ms max, '
+        f'{switches["bytes"]} bytes allocated'
+    )
+    print(f'scroll frame: {scroll["frame_ms"]:.4f} ms average, {scroll["bytes"]} bytes allocated over {args.refreshes} frames')
+    text_cache.dump()
+    response_cache.dump()
+
+
+if __name__ == '__main__':
+    main()
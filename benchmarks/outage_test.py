@@ -0,0 +1,266 @@
+"""
+Host-side test of how the sign rides out a WMATA outage, with a
+fault-injecting transport in place of the network.
+
+Runs on a host from the repository root:
+
+    python benchmarks/outage_test.py
+
+The transport replays benchmarks/fixtures/station_small.json like the
+harness's FixtureTransport, except while it is told to fail, when every
+request either raises OSError or answers 503. Backoff, the circuit breaker
+and the stale data limit are shortened (see TIMINGS) so the run takes seconds.
+
+Checked:
+    backoff    - a failing fetch retries metro_api_retries times, each retry
+                 waiting at most its backoff cap, and the sign's other tasks
+                 keep running while it waits
+    breaker    - circuit_failure_threshold failed fetches open the circuit,
+                 after which fetches fail without a request
+    half-open  - once circuit_reset_timeout has passed a single probe request
+                 is made, without retries; a failed probe opens the circuit
+                 again and a good one closes it
+    confirmed  - while WMATA answers with unchanged predictions (the same cached
+                 list each time), the board still counts down from the latest
+                 response rather than from when the list first arrived
+    stale      - scheduler.fetch_task keeps serving the last good predictions,
+                 marked stale, until they are stale_max_age old, then falls
+                 back on the timetable, and returns to live predictions once
+                 WMATA recovers
+
+Exits non-zero if any check fails.
+"""
+import asyncio
+import sys
+import time
+
+from harness import FixtureTransport, install_standins, load_fixture
+
+# Shortened config values for the run, in seconds.
+TIMINGS = {
+    'backoff_base': 0.05,
+    'backoff_max': 0.1,
+    'circuit_failure_threshold': 3,
+    'circuit_reset_timeout': 0.5,
+    'stale_max_age': 1.0,
+}
+# Slack for the host's scheduling jitter, in seconds.
+SLACK = 0.05
+
+
+class FaultyTransport(FixtureTransport):
+    """A FixtureTransport that fails every request while `failing` is set."""
+    def __init__(self):
+        super().__init__()
+        self.failing = False
+        # Monotonic time of every request.
+        self.request_times = []
+
+    def get(self, url: str, headers: dict = None):
+        self.request_times.append(time.monotonic())
+        response = super().get(url, headers)
+        if self.failing:
+            # Alternate between the two ways WMATA fails.
+            if len(self.request_times) % 2:
+                raise OSError('connection reset')
+            response.status_code = 503
+        return response
+
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, name: str, ok: bool, detail: str):
+        print(f'{"PASS" if ok else "FAIL"}  {name}: {detail}')
+        self.failures += not ok
+
+
+async def fetch_with_ticker(fetch) -> tuple:
+    """
+    Runs the coroutine function `fetch` alongside a task ticking every 10 ms.
+    Returns (result or raised exception, seconds taken, longest gap between ticks).
+    """
+    ticks = [time.monotonic()]
+    done = False
+
+    async def ticker():
+        while not done:
+            await asyncio.sleep(0.01)
+            ticks.append(time.monotonic())
+
+    ticking = asyncio.create_task(ticker())
+    start = time.monotonic()
+    try:
+        result = await fetch()
+    except Exception as e:
+        result = e
+    elapsed = time.monotonic() - start
+    done = True
+    await ticking
+    return result, elapsed, max((b - a for a, b in zip(ticks, ticks[1:])), default=0.0)
+
+
+def main():
+    install_standins()
+
+    import builtins
+    from config import config
+    config.update(TIMINGS)
+
+    import metro_api
+    import scheduler
+    import transport
+    from metro_api import MetroApi, MetroApiOnFireException
+    from quota import quota
+    from resilience import CircuitBreaker
+    from response_cache import response_cache
+
+    faulty = FaultyTransport()
+    faulty.body = load_fixture('station_small.json')
+    transport._transport = faulty
+    response_cache.ttl = 0
+    quota.per_second = quota.burst = quota.per_day = 1 << 30
+    breaker = metro_api._breaker
+    retries = config['metro_api_retries']
+    checks = Checks()
+
+    async def fetch():
+        return await MetroApi.fetch_train_predictions_async('A01', '1')
+
+    real_print = builtins.print
+    builtins.print = lambda *a, **k: None  # noqa: E731
+    try:
+        # Backoff: one failing fetch.
+        faulty.failing = True
+        before = len(faulty.request_times)
+        result, elapsed, longest_tick = asyncio.run(fetch_with_ticker(fetch))
+        times = faulty.request_times[before:]
+        waits = [b - a for a, b in zip(times, times[1:])]
+        caps = [min(config['backoff_max'], config['backoff_base'] * 2 ** attempt) for attempt in range(len(waits))]
+        backoff = (
+            isinstance(result, MetroApiOnFireException), len(times), waits, caps, elapsed, longest_tick
+        )
+
+        # Breaker: fail until the circuit opens, then once more.
+        for _ in range(config['circuit_failure_threshold'] - 1):
+            asyncio.run(fetch_with_ticker(fetch))
+        opened = breaker.state
+        before = len(faulty.request_times)
+        result, _, _ = asyncio.run(fetch_with_ticker(fetch))
+        refused = (isinstance(result, MetroApiOnFireException), len(faulty.request_times) - before)
+
+        # Half-open: a failing probe, then a good one.
+        time.sleep(config['circuit_reset_timeout'])
+        before = len(faulty.request_times)
+        asyncio.run(fetch_with_ticker(fetch))
+        failed_probe = (len(faulty.request_times) - before, breaker.state)
+        time.sleep(config['circuit_reset_timeout'])
+        faulty.failing = False
+        before = len(faulty.request_times)
+        result, _, _ = asyncio.run(fetch_with_ticker(fetch))
+        good_probe = (isinstance(result, list), len(faulty.request_times) - before, breaker.state)
+
+        # Stale: the sign's fetch task through an outage longer than stale_max_age.
+        stale = asyncio.run(run_outage(scheduler, faulty, fetch, MetroApiOnFireException))
+    finally:
+        builtins.print = real_print
+
+    failed, requests, waits, caps, elapsed, longest_tick = backoff
+    checks.check(
+        'backoff', failed and requests == retries + 1 and all(wait <= cap + SLACK for wait, cap in zip(waits, caps)),
+        f'{requests} requests, waits {", ".join(f"{wait * 1000:.0f}" for wait in waits)} ms '
+        f'(caps {", ".join(f"{cap * 1000:.0f}" for cap in caps)} ms)'
+    )
+    checks.check(
+        'backoff does not block', longest_tick < 0.01 + SLACK,
+        f'other tasks went at most {longest_tick * 1000:.0f} ms without running during a {elapsed * 1000:.0f} ms fetch'
+    )
+    checks.check(
+        'breaker opens', opened == CircuitBreaker.OPEN and refused == (True, 0),
+        f'{opened} after {config["circuit_failure_threshold"]} failed fetches, next fetch made {refused[1]} requests'
+    )
+    checks.check(
+        'half-open probe fails', failed_probe == (1, CircuitBreaker.OPEN),
+        f'{failed_probe[0]} request, then {failed_probe[1]}'
+    )
+    checks.check(
+        'half-open probe succeeds', good_probe == (True, 1, CircuitBreaker.CLOSED),
+        f'{good_probe[1]} request, then {good_probe[2]}'
+    )
+    for name, ok, detail in stale:
+        checks.check(name, ok, detail)
+    sys.exit(1 if checks.failures else 0)
+
+
+async def run_outage(scheduler, faulty, fetch, on_fire_exception) -> list:
+    """
+    Runs scheduler.fetch_task for one board through a healthy fetch, an outage
+    and the recovery, sampling what the board would show. Returns the checks'
+    (name, passed, detail).
+    """
+    scheduled = []
+
+    async def fetcher():
+        # As code.py does.
+        try:
+            return await fetch()
+        except on_fire_exception:
+            return None
+
+    scheduler.STALE_MAX_AGE = scheduler.config['stale_max_age']
+    scheduler.poll_interval = lambda data: 0.05
+    state = scheduler.SignState(['metro'], [None], [fetcher], [lambda: scheduled], [None])
+    task = asyncio.create_task(scheduler.fetch_task(state, 0))
+
+    async def sample(seconds: float) -> list:
+        """Returns (time, data, stale, scheduled) every 10 ms for `seconds`."""
+        samples = []
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            samples.append((time.monotonic(), state.data[0], state.stale[0], state.scheduled[0]))
+            await asyncio.sleep(0.01)
+        return samples
+
+    while state.data[0] is None:
+        await asyncio.sleep(0.01)
+    first_fetched_at = state.fetched_at[0]
+    healthy = await sample(0.3)
+    live = state.data[0]
+    fetched_at = state.fetched_at[0]
+    faulty.failing = True
+    outage = await sample(scheduler.STALE_MAX_AGE + 0.5)
+    faulty.failing = False
+    # The circuit is open by now; give it time to probe and close.
+    recovered = await sample(scheduler.config['circuit_reset_timeout'] + 0.3)
+    task.cancel()
+
+    stale_samples = [at for at, data, stale, _ in outage if stale and data is live]
+    fallback = next((at for at, data, _, is_scheduled in outage if is_scheduled and data is scheduled), None)
+    blank = [at for at, data, _, _ in outage if data is None]
+    kept_for = (stale_samples[-1] if stale_samples else fetched_at) - fetched_at
+    # The fixture never changes, so every fetch after the first hands back the same list.
+    unchanged = all(data is live for _, data, _, _ in healthy)
+    return [
+        (
+            'confirmed countdown', unchanged and fetched_at - first_fetched_at >= 0.1,
+            f'unchanged predictions last confirmed {fetched_at - first_fetched_at:.2f} s after they first arrived'
+        ),
+        (
+            'stale serving', bool(stale_samples) and not blank and kept_for >= scheduler.STALE_MAX_AGE - 0.1,
+            f'last good predictions kept, marked stale, for {kept_for:.2f} s of a {scheduler.STALE_MAX_AGE:.2f} s stale_max_age, '
+            f'board blank in {len(blank)} samples'
+        ),
+        (
+            'timetable fallback', fallback is not None and fallback - fetched_at >= scheduler.STALE_MAX_AGE,
+            f'timetable shown {fallback - fetched_at:.2f} s after the last good fetch' if fallback else 'timetable never shown'
+        ),
+        (
+            'recovery', recovered[-1][1] is not None and recovered[-1][1] is not scheduled and not recovered[-1][2],
+            'live predictions shown again' if recovered[-1][1] is not scheduled else 'still on the timetable'
+        ),
+    ]
+
+
+if __name__ == '__main__':
+    main()
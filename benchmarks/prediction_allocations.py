@@ -0,0 +1,71 @@
+"""
+Compares per-refresh heap allocation of dict predictions and Prediction records.
+
+Runs on a host from the repository root:
+
+    python benchmarks/prediction_allocations.py
+
+Each simulated refresh normalizes NUM_TRAINS raw trains into a new result
+list, the way MetroApi does, and tracemalloc reports the bytes allocated
+per refresh.
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prediction import Prediction  # noqa: E402
+
+NUM_TRAINS = 3
+REFRESHES = 1000
+
+_RAW_TRAINS = [
+    {'Car': '8', 'Destination': 'Glenmont', 'Line': 'RD', 'LocationCode': 'A01', 'Min': '3'},
+    {'Car': '6', 'Destination': 'Shady Grove', 'Line': 'RD', 'LocationCode': 'A01', 'Min': '7'},
+    {'Car': None, 'Destination': 'No Passenger', 'Line': 'No', 'LocationCode': 'A01', 'Min': '---'},
+]
+
+
+def as_dict(train: dict) -> dict:
+    """The record shape the APIs returned before Prediction."""
+    return {
+        'line_color': 0xFF0000,
+        'destination': train['Destination'],
+        'arrival': train['Min'],
+        'car': train['Car'] or '-'
+    }
+
+
+def as_prediction(train: dict) -> Prediction:
+    return Prediction(0xFF0000, train['Destination'], train['Min'], train['Car'] or '-', False)
+
+
+def measure(normalize) -> int:
+    """
+    Returns the bytes allocated per refresh. Results are kept alive until the
+    end so that CPython's free lists cannot hide allocations from tracemalloc.
+    """
+    normalize(_RAW_TRAINS[0])  # Warm up any lazily created type machinery.
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    results = [[normalize(train) for train in _RAW_TRAINS[:NUM_TRAINS]] for _ in range(REFRESHES)]
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    del results
+    return allocated // REFRESHES
+
+
+def main():
+    print(f'{"record":>12} {"bytes per refresh":>18}')
+    baseline = None
+    for name, normalize in (('dict', as_dict), ('Prediction', as_prediction)):
+        allocated = measure(normalize)
+        baseline = baseline or allocated
+        print(f'{name:>12} {allocated:>18} ({allocated / baseline:.0%})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Micro-benchmark for ranking.top_n against a full normalize-then-sort.
+
+Runs on a host from the repository root:
+
+    python benchmarks/ranking_benchmark.py
+
+Synthetic StationPrediction-style trains are ranked both ways and the
+time per call is printed for several list sizes.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prediction import Prediction  # noqa: E402
+from ranking import arrival_key, prediction_key, top_n  # noqa: E402
+
+NUM_TRAINS = 3
+SIZES = (10, 100, 1000, 10000)
+REPEAT = 20
+
+_LINES = ('RD', 'OR', 'YL', 'GR', 'BL', 'SV')
+_DESTINATIONS = ('Glenmont', 'Shady Grove', 'Largo', 'Vienna', 'Huntington', 'No Passenger')
+_ARRIVALS = ['BRD', 'ARR', '---', ''] + [str(minutes) for minutes in range(1, 40)]
+
+
+def make_trains(count: int, seed: int = 0) -> list[dict]:
+    """Builds `count` raw trains with the fields MetroApi keeps from a response."""
+    rng = random.Random(seed)
+    return [
+        {
+            'Car': rng.choice(('6', '8', None)),
+            'Destination': rng.choice(_DESTINATIONS),
+            'Line': rng.choice(_LINES),
+            'LocationCode': 'A01',
+            'Min': rng.choice(_ARRIVALS),
+        }
+        for _ in range(count)
+    ]
+
+
+def normalize(train: dict) -> Prediction:
+    """Stand-in for MetroApi._normalize_train_response with the same output type."""
+    return Prediction(0xFF0000, train.get('Destination', ''), train.get('Min', ''), train.get('Car') or '-', False)
+
+
+def normalize_then_sort(trains: list[dict]) -> list[Prediction]:
+    """The approach ranking replaces: normalize everything, sort everything, slice."""
+    normalized = [normalize(train) for train in trains]
+    normalized.sort(key=prediction_key)
+    return normalized[:NUM_TRAINS]
+
+
+def rank_then_normalize(trains: list[dict]) -> list[Prediction]:
+    """Select the top NUM_TRAINS raw trains, then normalize only those."""
+    return [normalize(train) for train in top_n(trains, NUM_TRAINS, lambda train: arrival_key(train['Min']))]
+
+
+def time_call(function, trains: list[dict]) -> float:
+    """Returns the best time in seconds over REPEAT calls."""
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(trains)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    print(f'{"trains":>8} {"normalize+sort":>16} {"top_n":>12} {"speedup":>8}')
+    for size in SIZES:
+        trains = make_trains(size)
+        assert normalize_then_sort(trains) == rank_then_normalize(trains)
+        baseline = time_call(normalize_then_sort, trains)
+        ranked = time_call(rank_then_normalize, trains)
+        print(f'{size:>8} {baseline * 1e6:>13.1f} us {ranked * 1e6:>9.1f} us {baseline / ranked:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
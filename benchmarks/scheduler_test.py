@@ -0,0 +1,194 @@
+"""
+Host-side test of input-to-switch latency and fetch/render overlap in the
+sign's cooperative scheduler (scheduler.py).
+
+Runs on a host from the repository root:
+
+    python benchmarks/scheduler_test.py [--seconds S] [--fetch-ms F] [--press-every P]
+
+The real scheduler tasks drive the TrainBoard and BusBoard on the stand-in
+display (see harness.py). The button is a stand-in pressed for 100 ms every
+--press-every seconds, and each board's fetcher is a stand-in that blocks for
+--fetch-ms like a WMATA request does, then returns new predictions.
+
+Reported:
+    switch       - from the button's release until the other board is shown
+    first render - from the release until the switched-to board is first
+                   rendered, which is what scheduler.SignState.switch_latency holds
+    overlap      - share of the run spent inside fetches, the scroll frames
+                   and renders run between them, and the longest time the
+                   button and the scroll went unserviced
+
+Exits non-zero if a switch waits longer than one fetch and a button poll, a
+first render longer than one fetch and a render interval, or the button goes
+unpolled for longer than one fetch and a poll interval: only a request that
+is already running may hold up input or drawing.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from harness import install_standins
+
+# Slack for the host's scheduling jitter, in seconds.
+SLACK = 0.05
+
+
+class StandinButton:
+    """Stands in for an adafruit_debouncer Debouncer, pressed on a fixed timeline."""
+    def __init__(self, press_every: float, hold: float = 0.1):
+        self.press_every = press_every
+        self.hold = hold
+        self.start = None
+        self.fell = False
+        self.rose = False
+        self._pressed = False
+        # Monotonic times of every update() and every release.
+        self.polls = []
+        self.releases = []
+
+    def update(self):
+        now = time.monotonic()
+        if self.start is None:
+            self.start = now
+        self.polls.append(now)
+        phase = (now - self.start) % self.press_every
+        pressed = now - self.start >= self.press_every and phase < self.hold
+        self.fell = pressed and not self._pressed
+        self.rose = self._pressed and not pressed
+        if self.rose:
+            # When the button really came up, however late this poll is.
+            self.releases.append(now - phase + self.hold if phase >= self.hold else now)
+        self._pressed = pressed
+
+
+class StandinFetcher:
+    """Blocks like a WMATA request, then returns new predictions."""
+    def __init__(self, fetch_seconds: float, line_color: int):
+        self.fetch_seconds = fetch_seconds
+        self.line_color = line_color
+        # (start, end) monotonic times of every fetch.
+        self.fetches = []
+
+    async def __call__(self):
+        from prediction import Prediction
+        start = time.monotonic()
+        time.sleep(self.fetch_seconds)
+        minutes = str(len(self.fetches) % 20 + 1)
+        self.fetches.append((start, time.monotonic()))
+        return [Prediction(self.line_color, 'Shady Grove', minutes, '8', False), Prediction(self.line_color, 'Glenmont', '12', '6', False)]
+
+
+def _record_calls(obj, name: str, times: list, index: int = None):
+    """Wraps obj.name so every call appends its monotonic time (or (time, index)) to `times`."""
+    method = getattr(obj, name)
+
+    def recorded(*args, **kwargs):
+        result = method(*args, **kwargs)
+        times.append(time.monotonic() if index is None else (time.monotonic(), index))
+        return result
+    setattr(obj, name, recorded)
+
+
+def _longest_gap(times: list) -> float:
+    return max((b - a for a, b in zip(times, times[1:])), default=0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10, help='length of the run')
+    parser.add_argument('--fetch-ms', type=float, default=300, help='how long each stand-in fetch blocks')
+    parser.add_argument('--press-every', type=float, default=1.3, help='seconds between button presses')
+    parser.add_argument('--poll-seconds', type=float, default=0.5, help='interval between fetches of the current board')
+    args = parser.parse_args()
+
+    install_standins()
+
+    import builtins
+    import scheduler
+    from adafruit_matrixportal.matrix import Matrix
+    from bus_board import BusBoard
+    from train_board import TrainBoard
+
+    # Fetch often so the run sees many fetches, whatever the predictions say.
+    scheduler.poll_interval = lambda data: args.poll_seconds
+    fetch_seconds = args.fetch_ms / 1000
+
+    real_print = builtins.print
+    builtins.print = lambda *a, **k: None  # noqa: E731
+    try:
+        display = Matrix().display
+        boards = [TrainBoard(display), BusBoard(display)]
+        boards[0].show()
+        fetchers = [StandinFetcher(fetch_seconds, 0xFF0000), StandinFetcher(fetch_seconds, 0x00FF00)]
+        state = scheduler.SignState(['metro', 'bus'], boards, fetchers, [lambda: None] * 2, [None] * 2)
+        button = StandinButton(args.press_every)
+
+        shows = []
+        renders = []
+        frames = []
+        for i, board in enumerate(boards):
+            _record_calls(board, 'show', shows, i)
+            _record_calls(board, 'render', renders, i)
+            _record_calls(board, 'scroll', frames)
+
+        async def run():
+            try:
+                await asyncio.wait_for(asyncio.gather(*scheduler.tasks(state, button)), args.seconds)
+            except asyncio.TimeoutError:
+                pass
+
+        start = time.monotonic()
+        asyncio.run(run())
+        elapsed = time.monotonic() - start
+    finally:
+        builtins.print = real_print
+
+    switch_latencies = []
+    render_latencies = []
+    for release in button.releases:
+        shown = next(((at, i) for at, i in shows if at >= release), None)
+        if shown is None:
+            continue
+        rendered = next((at for at, i in renders if at >= shown[0] and i == shown[1]), None)
+        switch_latencies.append(shown[0] - release)
+        if rendered is not None:
+            render_latencies.append(rendered - release)
+
+    fetches = sorted(fetch for fetcher in fetchers for fetch in fetcher.fetches)
+    busy = sum(end - begin for begin, end in fetches)
+
+    def summary(latencies: list) -> str:
+        latencies = sorted(latencies)
+        return f'{latencies[len(latencies) // 2] * 1000:.1f} ms median, {latencies[-1] * 1000:.1f} ms max over {len(latencies)}'
+
+    print(f'{elapsed:.1f} s run, {len(fetches)} fetches of {args.fetch_ms:.0f} ms, {len(button.releases)} presses')
+    print(f'switch:        {summary(switch_latencies)}')
+    print(f'first render:  {summary(render_latencies)} (last recorded by the scheduler: {state.switch_latency * 1000:.1f} ms)')
+    print(
+        f'overlap:       {busy / elapsed:.0%} of the run in fetches, {len(frames)} scroll frames '
+        f'({scheduler.SCROLL_INTERVAL * 1000:.0f} ms apart) and {len(renders)} renders between them'
+    )
+    print(
+        f'longest gaps:  button {_longest_gap(button.polls) * 1000:.1f} ms, scroll {_longest_gap(frames) * 1000:.1f} ms '
+        f'(one fetch is {args.fetch_ms:.0f} ms)'
+    )
+
+    failures = []
+    if not switch_latencies or not render_latencies:
+        failures.append('no board switch was seen')
+    else:
+        if max(switch_latencies) > fetch_seconds + scheduler.BUTTON_POLL_INTERVAL + SLACK:
+            failures.append('a switch waited for more than the fetch already running')
+        if max(render_latencies) > fetch_seconds + scheduler.RENDER_INTERVAL + SLACK:
+            failures.append('a switched-to board took longer than one fetch to render')
+    if _longest_gap(button.polls) > fetch_seconds + scheduler.BUTTON_POLL_INTERVAL + SLACK:
+        failures.append('the button went unpolled for longer than one fetch')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Long-running memory soak test of the fetch and render cycle.
+
+Runs on a Linux host from the repository root:
+
+    python benchmarks/soak.py [--minutes M] [--sample-every N]
+
+Starts the fake WMATA server from aggregator_load.py, whose predictions keep
+changing, and runs the sign's cycle against it for --minutes: collect garbage,
+fetch through the real Transport and adafruit_requests, render on the board,
+alternating between the train and bus boards like code.py does when the
+button is pressed.
+
+Every --sample-every cycles, right after the collection, it prints the live
+heap (tracemalloc), the peak reached since the last sample, and the free
+memory and largest free chunk of the C heap. The script restarts itself with
+PYTHONMALLOC=malloc so every allocation comes from glibc's heap, whose free
+chunks stand in for the board's heap; a largest free chunk that keeps
+shrinking while free memory stays level means the heap is fragmenting. Live
+heap that keeps growing means something is leaking. At the end it prints
+the requests made over how many connections, and the timing stats including
+each request's connect, first byte and body phases.
+
+On the board itself the same figures are kept by stats.sample_memory() after
+every collection and printed with the other stats.
+"""
+import argparse
+import ctypes
+import gc
+import os
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import ThreadingHTTPServer
+
+from aggregator_load import FakeWmata
+from harness import install_standins
+
+
+def c_heap() -> tuple:
+    """
+    Returns (free bytes, largest free chunk in bytes) of glibc's main heap,
+    from malloc_info(). A chunk size is only known to within its bin, so the
+    upper bound of the largest non-empty bin is used.
+    """
+    libc = ctypes.CDLL(None)
+    libc.fopen.restype = ctypes.c_void_p
+    libc.fopen.argtypes = (ctypes.c_char_p, ctypes.c_char_p)
+    libc.fclose.argtypes = (ctypes.c_void_p,)
+    libc.malloc_info.argtypes = (ctypes.c_int, ctypes.c_void_p)
+
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        stream = libc.fopen(path.encode(), b'w')
+        libc.malloc_info(0, stream)
+        libc.fclose(stream)
+        with open(path) as f:
+            info = f.read()
+    finally:
+        os.remove(path)
+
+    # Only the main arena (heap 0); the script runs in a single thread.
+    heap = info[info.index('<heap nr="0">'):info.index('</heap>')]
+    largest = 0
+    for low, high, count in re.findall(r'<size from="(\d+)" to="(\d+)" total="\d+" count="(\d+)"/>', heap):
+        if int(count):
+            largest = max(largest, int(high))
+    free = sum(int(size) for size in re.findall(r'<total type="(?:fast|rest)" count="\d+" size="(\d+)"/>', heap))
+    # The top chunk, above every other chunk, is free too.
+    mallinfo = libc.mallinfo2
+    mallinfo.restype = _MallInfo2
+    top = mallinfo().keepcost
+    return free + top, max(largest, top)
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in (
+        'arena', 'ordblks', 'smblks', 'hblks', 'hblkhd', 'usmblks', 'fsmblks', 'uordblks', 'fordblks', 'keepcost'
+    )]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=10, help='length of the run')
+    parser.add_argument('--sample-every', type=int, default=500, help='cycles between samples')
+    parser.add_argument('--switch-every', type=int, default=50, help='cycles between board switches')
+    args = parser.parse_args()
+
+    if os.environ.get('PYTHONMALLOC') != 'malloc':
+        os.environ['PYTHONMALLOC'] = 'malloc'
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    install_standins()
+
+    import builtins
+    import transport
+    from adafruit_matrixportal.matrix import Matrix
+    from bus_api import BusApi
+    from bus_board import BusBoard
+    from config import config
+    from metro_api import MetroApi
+    from quota import quota
+    from receive_buffer import receive_buffer
+    from response_cache import response_cache
+    from stats import stats
+    from train_board import TrainBoard
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeWmata)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    config['metro_api_url'] = base + '/StationPrediction.svc/json/GetPrediction/'
+    config['bus_api_url'] = base + '/NextBusService.svc/json/jPredictions?StopID='
+    response_cache.ttl = 0
+    # Soak for longer than the free tier would allow in a day.
+    quota.per_second = quota.burst = quota.per_day = 1 << 30
+    transport._transport = transport.Transport(socket)
+
+    fetchers = [
+        lambda: MetroApi.fetch_train_predictions('A01', '1'),
+        lambda: BusApi.fetch_bus_predictions('1001344', '0'),
+    ]
+
+    real_print = builtins.print
+    builtins.print = lambda *a, **k: None  # noqa: E731
+    display = Matrix().display
+    boards = [TrainBoard(display), BusBoard(display)]
+    samples = []
+    real_print(f'{"cycle":>8} {"seconds":>8} {"live KiB":>9} {"peak KiB":>9} {"free KiB":>9} {"largest KiB":>11}')
+    try:
+        tracemalloc.start()
+        start = time.monotonic()
+        cycle = 0
+        while time.monotonic() - start < args.minutes * 60:
+            index = (cycle // args.switch_every) % len(boards)
+            if cycle % args.switch_every == 0:
+                boards[index].show()
+
+            gc.collect()
+            if cycle % args.sample_every == 0:
+                live, peak = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                free, largest = c_heap()
+                samples.append((cycle, time.monotonic() - start, live, peak, free, largest))
+                real_print(
+                    f'{cycle:>8} {samples[-1][1]:>8.0f} {live / 1024:>9.1f} {peak / 1024:>9.1f} '
+                    f'{free / 1024:>9.1f} {largest / 1024:>11.1f}'
+                )
+
+            boards[index].render(fetchers[index]())
+            cycle += 1
+    finally:
+        tracemalloc.stop()
+        builtins.print = real_print
+        server.shutdown()
+
+    if len(samples) > 1:
+        # The first sample is taken before anything was fetched.
+        first, last = samples[1], samples[-1]
+        print(
+            f'{cycle} cycles, {FakeWmata.requests} WMATA requests, {receive_buffer.bodies} bodies read '
+            f'into one {len(receive_buffer._buffer)} byte buffer (largest body {receive_buffer.largest_body} bytes)'
+        )
+        transport.get_transport().dump()
+        stats.dump()
+        print(
+            f'live heap {first[2] / 1024:.1f} -> {last[2] / 1024:.1f} KiB, '
+            f'largest free chunk {min(sample[5] for sample in samples[1:]) / 1024:.1f} KiB at its smallest'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Stand-in for adafruit_bitmap_font.bitmap_font."""
+import displayio
+
+
+class _Glyph:
+    def __init__(self, code_point):
+        self.code_point = code_point
+        self.width = 5
+        self.height = 7
+        self.dx = 0
+        self.dy = -1
+        self.shift_x = 5
+        self.shift_y = 0
+        self.bitmap = displayio.Bitmap(self.width, self.height, 2)
+        self.bitmap.fill(1)
+
+
+class _Font:
+    def __init__(self):
+        self._glyphs = {}
+
+    def load_glyphs(self, code_points):
+        for code_point in code_points:
+            if isinstance(code_point, str):
+                code_point = ord(code_point)
+            self.get_glyph(code_point)
+
+    def get_glyph(self, code_point):
+        glyph = self._glyphs.get(code_point)
+        if glyph is None:
+            glyph = self._glyphs[code_point] = _Glyph(code_point)
+        return glyph
+
+    def get_bounding_box(self):
+        return (5, 7, 0, -1)
+
+
+def load_font(path):
+    return _Font()
@@ -0,0 +1,34 @@
+"""Stand-in for adafruit_display_text.label."""
+import displayio
+
+
+class Label:
+    def __init__(self, font, *, text='', color=0xFFFFFF, max_glyphs=None, anchor_point=None, **kwargs):
+        self.font = font
+        self.max_glyphs = max_glyphs
+        self.anchor_point = anchor_point
+        self.x = 0
+        self.y = 0
+        self._text = text
+        self._color = color
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        displayio.count_write()
+        # The real Label lays out one glyph tile per character.
+        for character in value:
+            self.font.get_glyph(ord(character))
+        self._text = value
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, value):
+        displayio.count_write()
+        self._color = value
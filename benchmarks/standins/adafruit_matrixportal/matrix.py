@@ -0,0 +1,16 @@
+"""Stand-in for adafruit_matrixportal.matrix."""
+
+
+class _Display:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.root_group = None
+
+    def show(self, group):
+        self.root_group = group
+
+
+class Matrix:
+    def __init__(self, *, width=64, height=32, bit_depth=2, **kwargs):
+        self.display = _Display(width, height)
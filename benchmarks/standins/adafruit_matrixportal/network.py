@@ -0,0 +1,9 @@
+"""Stand-in for adafruit_matrixportal.network; benchmarks replace the transport instead."""
+
+
+class Network:
+    def __init__(self, *, status_neopixel=None, **kwargs):
+        pass
+
+    def connect(self):
+        pass
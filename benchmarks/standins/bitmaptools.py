@@ -0,0 +1,5 @@
+"""Stand-in for bitmaptools."""
+
+
+def blit(dest_bitmap, source_bitmap, x, y, *, x1=0, y1=0, x2=None, y2=None, skip_source_index=None, skip_dest_index=None):
+    dest_bitmap.blit(x, y, source_bitmap, x1=x1, y1=y1, x2=x2, y2=y2, skip_index=skip_source_index)
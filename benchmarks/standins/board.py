@@ -0,0 +1,4 @@
+"""Stand-in for the CircuitPython board module."""
+NEOPIXEL = 'NEOPIXEL'
+BUTTON_UP = 'BUTTON_UP'
+BUTTON_DOWN = 'BUTTON_DOWN'
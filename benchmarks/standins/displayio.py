@@ -0,0 +1,116 @@
+"""Stand-in for displayio that counts writes made to display objects."""
+
+# Total number of property writes made to display objects since the last reset.
+write_count = 0
+
+
+def count_write():
+    global write_count
+    write_count += 1
+
+
+def reset_write_count():
+    global write_count
+    write_count = 0
+
+
+class Group:
+    def __init__(self, *, max_size=None, scale=1, x=0, y=0):
+        self._children = []
+        self._hidden = False
+        self.x = x
+        self.y = y
+
+    def append(self, layer):
+        self._children.append(layer)
+
+    def __len__(self):
+        return len(self._children)
+
+    def __getitem__(self, index):
+        return self._children[index]
+
+    @property
+    def hidden(self):
+        return self._hidden
+
+    @hidden.setter
+    def hidden(self, value):
+        count_write()
+        self._hidden = value
+
+
+class Bitmap:
+    def __init__(self, width, height, value_count):
+        self.width = width
+        self.height = height
+        self._pixels = bytearray(width * height)
+
+    def __getitem__(self, index):
+        x, y = index
+        return self._pixels[y * self.width + x]
+
+    def __setitem__(self, index, value):
+        # Pixel writes draw off-screen text; only fills and blits count.
+        x, y = index
+        self._pixels[y * self.width + x] = value
+
+    def fill(self, value):
+        count_write()
+        for i in range(len(self._pixels)):
+            self._pixels[i] = value
+
+    def blit(self, x, y, source, *, x1=0, y1=0, x2=None, y2=None, skip_index=None):
+        count_write()
+        x2 = source.width if x2 is None else x2
+        y2 = source.height if y2 is None else y2
+        if not (0 <= x <= self.width and 0 <= y <= self.height):
+            raise ValueError('out of range')
+        for row in range(y1, y2):
+            if y + row - y1 >= self.height:
+                break
+            for column in range(x1, x2):
+                if x + column - x1 >= self.width:
+                    break
+                value = source._pixels[row * source.width + column]
+                if value != skip_index:
+                    self._pixels[(y + row - y1) * self.width + x + column - x1] = value
+
+
+class Palette:
+    def __init__(self, color_count):
+        self._colors = [0] * color_count
+
+    def __len__(self):
+        return len(self._colors)
+
+    def __getitem__(self, index):
+        return self._colors[index]
+
+    def __setitem__(self, index, value):
+        count_write()
+        self._colors[index] = value
+
+    def make_transparent(self, index):
+        pass
+
+
+class TileGrid:
+    def __init__(self, bitmap, *, pixel_shader, width=1, height=1, tile_width=None, tile_height=None, default_tile=0, x=0, y=0):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.width = width
+        self.height = height
+        self.x = x
+        self.y = y
+        self._tiles = bytearray([default_tile] * (width * height))
+        self.hidden = False
+
+    def __getitem__(self, index):
+        x, y = index if isinstance(index, tuple) else (index % self.width, index // self.width)
+        return self._tiles[y * self.width + x]
+
+    def __setitem__(self, index, value):
+        count_write()
+        x, y = index if isinstance(index, tuple) else (index % self.width, index // self.width)
+        self._tiles[y * self.width + x] = value
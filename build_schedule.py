@@ -0,0 +1,224 @@
+"""
+Builds the timetable index signs fall back on while WMATA is unreachable
+(see schedule.py) from WMATA's GTFS static feeds.
+
+Runs on a normal host from the repository root, next to the sign's
+wifiandapikey.txt (config.py reads it):
+
+    python build_schedule.py rail-gtfs.zip bus-gtfs.zip [--output schedule.bin] [--days 90]
+
+WMATA publishes the Metrorail and Metrobus feeds separately; pass either or
+both. Only the stations and stops the sign shows are indexed:
+config['metro_station_code'] and config['bus_stop_id'], plus any --stop. A
+key matches a GTFS stop whose stop_code or stop_id is the key, or whose
+stop_id has the key as one of its underscore-separated parts (WMATA's rail
+stop IDs contain the station code), along with the platforms of any station
+matched. --stop KEY=STOP_ID[,STOP_ID...] names the GTFS stops of a key instead.
+
+Service days from --start (default today) for --days days are resolved from
+calendar.txt and calendar_dates.txt. Copy the output to the CIRCUITPY drive
+as config['schedule_path'] and rebuild it before the covered days run out.
+"""
+import argparse
+import csv
+import datetime
+import io
+import zipfile
+
+import schedule
+from clock import days_from_civil
+from config import config
+
+# Metrorail routes are named after their line; the sign knows lines by code.
+_LINE_CODES = {
+    'RED': 'RD',
+    'ORANGE': 'OR',
+    'SILVER': 'SV',
+    'BLUE': 'BL',
+    'YELLOW': 'YL',
+    'GREEN': 'GR'
+}
+
+
+def _rows(feed: zipfile.ZipFile, name: str):
+    """Yields the rows of one GTFS file as dicts, or nothing if the feed lacks it."""
+    if name not in feed.namelist():
+        return
+    with feed.open(name) as f:
+        yield from csv.DictReader(io.TextIOWrapper(f, 'utf-8-sig'))
+
+
+def _keys(values) -> list:
+    if not values:
+        return []
+    return values.split(',') if isinstance(values, str) else list(values)
+
+
+def _match_stops(stops: list, key: str, stop_ids: list) -> set:
+    """Returns the stop_ids of a feed that belong to `key`."""
+    if stop_ids:
+        matched = {stop['stop_id'] for stop in stops if stop['stop_id'] in stop_ids}
+    else:
+        matched = {
+            stop['stop_id'] for stop in stops
+            if key in (stop.get('stop_code'), stop['stop_id']) or key in stop['stop_id'].split('_')
+        }
+    # Departures are made from the platforms of a station.
+    matched |= {stop['stop_id'] for stop in stops if stop.get('parent_station') in matched}
+    return matched
+
+
+def _active_services(feed: zipfile.ZipFile, days: list) -> list:
+    """Returns the set of service_ids running on each of `days` (days since 1970)."""
+    weekdays = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+    active = [set() for _ in days]
+    first = days[0]
+
+    def day_number(date: str) -> int:
+        return days_from_civil(int(date[:4]), int(date[4:6]), int(date[6:8]))
+
+    for row in _rows(feed, 'calendar.txt'):
+        start = day_number(row['start_date'])
+        end = day_number(row['end_date'])
+        for i, day in enumerate(days):
+            # 1970-01-01 was a Thursday.
+            if start <= day <= end and row[weekdays[(day + 3) % 7]] == '1':
+                active[i].add(row['service_id'])
+
+    for row in _rows(feed, 'calendar_dates.txt'):
+        i = day_number(row['date']) - first
+        if 0 <= i < len(days):
+            if row['exception_type'] == '1':
+                active[i].add(row['service_id'])
+            elif row['exception_type'] == '2':
+                active[i].discard(row['service_id'])
+    return active
+
+
+def _minute(time_of_day: str) -> int:
+    hours, minutes, _ = time_of_day.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def build(feed_paths: list, keys: dict, first_day: int, day_count: int) -> bytes:
+    """
+    Returns the timetable index for `keys` (key -> list of GTFS stop_ids, empty
+    to match by code) over `day_count` days from `first_day`.
+    """
+    days = list(range(first_day, first_day + day_count))
+    strings = {}
+
+    def string(text: str) -> int:
+        if text not in strings:
+            strings[text] = len(strings)
+        return strings[text]
+
+    # (key, service) -> [(minute, direction, route, headsign)], services being (feed, service_id).
+    departures = {}
+    # Services running on each day, across all feeds.
+    active = [set() for _ in days]
+
+    for feed_number, path in enumerate(feed_paths):
+        with zipfile.ZipFile(path) as feed:
+            stops = list(_rows(feed, 'stops.txt'))
+            stop_keys = {}
+            for key, stop_ids in keys.items():
+                for stop_id in _match_stops(stops, key, stop_ids):
+                    stop_keys.setdefault(stop_id, []).append(key)
+            if not stop_keys:
+                continue
+
+            routes = {}
+            for row in _rows(feed, 'routes.txt'):
+                name = row.get('route_short_name') or row['route_id']
+                routes[row['route_id']] = _LINE_CODES.get(name.upper(), name)
+            trips = {
+                row['trip_id']: (row['service_id'], row.get('direction_id') or '0', routes.get(row['route_id'], ''), row.get('trip_headsign', ''))
+                for row in _rows(feed, 'trips.txt')
+            }
+
+            for row in _rows(feed, 'stop_times.txt'):
+                stop_key_list = stop_keys.get(row['stop_id'])
+                if stop_key_list is None or row.get('pickup_type') == '1' or not row.get('departure_time'):
+                    continue
+                trip = trips.get(row['trip_id'])
+                if trip is None:
+                    continue
+                service_id, direction, route, headsign = trip
+                departure = (_minute(row['departure_time']), int(direction), string(route), string(row.get('stop_headsign') or headsign))
+                for key in stop_key_list:
+                    departures.setdefault((key, (feed_number, service_id)), []).append(departure)
+
+            for i, services in enumerate(_active_services(feed, days)):
+                active[i] |= {(feed_number, service_id) for service_id in services}
+
+    # Only services stopping at an indexed stop tell days apart.
+    used = {service for _, service in departures}
+    patterns = []
+    day_patterns = bytearray()
+    for services in active:
+        services = frozenset(services & used)
+        if not services:
+            day_patterns.append(schedule.NO_SERVICE)
+            continue
+        if services not in patterns:
+            if len(patterns) >= schedule.MAX_PATTERNS:
+                raise ValueError(f'more than {schedule.MAX_PATTERNS} service patterns; index fewer days')
+            patterns.append(services)
+        day_patterns.append(patterns.index(services))
+
+    stop_entries = bytearray()
+    departure_data = bytearray()
+    count = 0
+    for key in sorted(keys, key=lambda key: key.encode('utf-8')):
+        stop_entries += key.encode('utf-8')[:schedule.KEY_SIZE].ljust(schedule.KEY_SIZE, b'\x00')
+        for services in patterns:
+            run = sorted({departure for service in services for departure in departures.get((key, service), ())})
+            stop_entries += schedule.RUN.pack(count, len(run))
+            for departure in run:
+                departure_data += schedule.DEPARTURE.pack(*departure)
+            count += len(run)
+
+    offsets = bytearray()
+    string_data = bytearray()
+    for text in strings:
+        offsets += schedule.OFFSET.pack(len(string_data))
+        string_data += text.encode('utf-8')
+    offsets += schedule.OFFSET.pack(len(string_data))
+
+    header = schedule.HEADER.pack(schedule.MAGIC, schedule.VERSION, len(patterns), first_day, day_count, len(keys), len(strings), count)
+    return header + day_patterns + stop_entries + departure_data + offsets + string_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('feeds', nargs='+', help='GTFS static feed zip files')
+    parser.add_argument('--output', default=config['schedule_path'] or 'schedule.bin', help='index file to write')
+    parser.add_argument('--start', help='first service day, YYYY-MM-DD (default today)')
+    parser.add_argument('--days', type=int, default=90, help='service days to cover')
+    parser.add_argument('--stop', action='append', default=[], metavar='KEY=STOP_ID[,STOP_ID...]', help='GTFS stops to index under KEY')
+    args = parser.parse_args()
+
+    keys = {key: [] for key in _keys(config['metro_station_code']) + _keys(config['bus_stop_id'])}
+    for value in args.stop:
+        key, _, stop_ids = value.partition('=')
+        keys[key] = stop_ids.split(',') if stop_ids else []
+    for key in keys:
+        if len(key.encode('utf-8')) > schedule.KEY_SIZE:
+            parser.error(f'stop key {key!r} is longer than {schedule.KEY_SIZE} bytes')
+
+    start = datetime.date.fromisoformat(args.start) if args.start else datetime.date.today()
+    first_day = days_from_civil(start.year, start.month, start.day)
+    data = build(args.feeds, keys, first_day, args.days)
+    with open(args.output, 'wb') as f:
+        f.write(data)
+
+    _, _, patterns, _, _, stops, strings, departures = schedule.HEADER.unpack_from(data)
+    print(
+        f'Wrote {args.output}: {len(data)} bytes, {stops} stops, {departures} departures, '
+        f'{patterns} service patterns, {strings} strings, {args.days} days from {start}.'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,31 @@
-import board # type: ignore
-from adafruit_matrixportal.network import Network # type: ignore
+import adafruit_json_stream as json_stream # type: ignore
 
+import log
 from config import config
+from prediction import Prediction
+from ranking import arrival_key, top_n
+from quota import quota
+from receive_buffer import receive_buffer
+from resilience import CircuitBreaker, backoff_delay, run_async, run_blocking
+from response_cache import response_cache
+from schedule import schedule
+from settings import settings
+from stats import stats
+from transport import get_transport
 from secrets import secrets # type: ignore
 
-# Keeping a global reference for this
-_network = Network(status_neopixel=board.NEOPIXEL)
-
 class MetroApiOnFireException(Exception):
     """Custom exception for when the MetroBus API is consistently unreachable."""
     pass
 
+# Stops calling the API during outages instead of hammering it.
+_breaker = CircuitBreaker('Bus API', config['circuit_failure_threshold'], config['circuit_reset_timeout'])
+
 class BusApi:
     """
     A class to interact with the Metro Transit API for bus predictions.
     """
 
-    _DEFAULT_COLOR = 0xADD8E6 # Default color for bus lines
-
     # A set for quick lookup of destination strings that need normalization.
     _DESTINATION_NORMALIZATIONS = {
         'No Passenger',
@@ -25,11 +33,88 @@ class BusApi:
         'ssenger'
     }
 
+    # The only NextBus prediction fields read by _normalize_bus_response and _bus_key.
+    _BUS_FIELDS = {
+        'RouteID',
+        'DirectionText',
+        'Minutes'
+    }
+
+    # The per-stop results and merged list from the last multi-stop fetch.
+    _merged_parts = None
+    _merged_results = None
+
+    @staticmethod
+    def fetch_bus_predictions(stop_id, direction_num: str) -> list[Prediction]:
+        """
+        Fetches bus predictions for a given stop, or a list (or comma-separated
+        string) of stops merged by arrival. NextBus takes one stop per request,
+        so each stop is fetched (and cached) separately.
+        Only the first num_trains buses by arrival are returned.
+        When no stop changed, the previously merged list object is returned.
+        Sleeps through quota and backoff waits; the sign uses fetch_bus_predictions_async.
+        """
+        return run_blocking(BusApi._fetch_bus_predictions(stop_id, direction_num))
+
+    @staticmethod
+    async def fetch_bus_predictions_async(stop_id, direction_num: str) -> list[Prediction]:
+        """Like fetch_bus_predictions, but awaits the quota and backoff waits so the sign's other tasks keep running."""
+        return await run_async(BusApi._fetch_bus_predictions(stop_id, direction_num))
+
+    @staticmethod
+    def _fetch_bus_predictions(stop_id, direction_num: str):
+        """
+        Does the work of fetch_bus_predictions as a generator that yields the
+        seconds to wait (for the API quota or before a retry) and returns the
+        predictions.
+        """
+        stop_ids = stop_id.split(',') if isinstance(stop_id, str) else stop_id
+        if len(stop_ids) == 1:
+            return (yield from BusApi._fetch_stop_predictions(stop_ids[0], direction_num))
+
+        parts = []
+        for stop in stop_ids:
+            parts.append((yield from BusApi._fetch_stop_predictions(stop, direction_num)))
+        last_parts = BusApi._merged_parts
+        if last_parts is not None and len(last_parts) == len(parts) and all(a is b for a, b in zip(parts, last_parts)):
+            return BusApi._merged_results
+
+        merged = []
+        for part in parts:
+            merged.extend(part)
+        BusApi._merged_parts = parts
+        BusApi._merged_results = top_n(merged, settings.num_trains)
+        return BusApi._merged_results
+
+    @staticmethod
+    def fetch_scheduled_departures(stop_id, direction_num: str) -> list[Prediction]:
+        """
+        Returns the next num_trains departures in `direction_num` at the stop (or
+        stops) from the timetable, for when WMATA is unreachable. They are
+        normalized like live predictions, with `scheduled` set.
+        Returns None if there is no timetable or the time of day is not known yet.
+        """
+        stop_ids = stop_id.split(',') if isinstance(stop_id, str) else stop_id
+        try:
+            direction = int(direction_num)
+        except ValueError:
+            direction = None
+        departures = schedule.departures(stop_ids, direction, settings.num_trains)
+        if departures is None:
+            return None
+        return [
+            Prediction(BusApi._get_line_color(route), BusApi._destination_text(route, destination), minutes, '-', True)
+            for minutes, route, destination in departures
+        ]
+
     @staticmethod
-    def fetch_bus_predictions(stop_id: str, direction_num: str) -> list[dict]:
+    def _fetch_stop_predictions(stop_id: str, direction_num: str) -> list[Prediction]:
         """
         Fetches bus predictions for a given station and direction_num.
-        Includes retry logic for API connection issues to improve resilience.
+        Includes retry logic with backoff for API connection issues, and a circuit
+        breaker that fails fast while the API is down.
+        Results are cached; an unchanged response returns the previous list object.
+        A generator like _fetch_bus_predictions.
         """
         retry_attempt = 0
         # Loop to handle retries instead of recursion, preventing potential stack overflow.
@@ -39,30 +124,115 @@ class BusApi:
                 api_url = f"{config['bus_api_url']}{stop_id}"
                 headers = {'api_key': config['metro_api_key']}
 
-                # Fetch data from the network and parse as JSON.
-                bus_data = _network.fetch(api_url, headers=headers).json()
-
-                print('Received response from WMATA api...')
-
-                # Use a list comprehension for efficient filtering and mapping.
-                # .get() is used to safely access dictionary keys, providing a default empty list
-                # if 'bus' key is missing, preventing KeyError.
-                normalized_results = [
-                    BusApi._normalize_bus_response(bus)
-                    for bus in bus_data.get('Predictions', [])
-                    if bus.get('DirectionNum') == direction_num # Safely check 'direction_num' key.
-                ]
-                return normalized_results
-            except RuntimeError as e:
-                # Catch specific network-related errors.
-                print(f'Failed to connect to WMATA API. Error: {e}. Reattempting...')
+                # Serve straight from the cache while the last result is fresh.
+                cache_key = (api_url, direction_num)
+                cached = response_cache.lookup(cache_key)
+                if cached is not None:
+                    return cached
+
+                if not _breaker.allow():
+                    raise MetroApiOnFireException("Bus API circuit is open; not fetching bus predictions.")
+                if quota.exhausted():
+                    raise MetroApiOnFireException("Daily WMATA quota used up; not fetching bus predictions.")
+
+                # Wait out the per-second budget here, where the sign can await it,
+                # rather than inside the request.
+                wait = quota.wait_time()
+                while wait > 0:
+                    yield wait
+                    wait = quota.wait_time()
+
+                start = stats.now()
+                response = get_transport().get(api_url, headers=response_cache.request_headers(cache_key, headers))
+                stats.record('fetch', start)
+                if response.status_code not in (200, 304):
+                    # Error bodies (rate limiting, a bad key, outages) hold no predictions.
+                    response.close()
+                    raise RuntimeError(f'HTTP status {response.status_code}')
+
+                # Stream the response body, dropping other directions as they are parsed
+                # and ranking buses as they arrive, so only the first num_trains are ever held.
+                start = stats.now()
+                try:
+                    buses = [] if response.status_code == 304 else top_n(BusApi._decode_buses(response, direction_num), settings.num_trains, BusApi._bus_key)
+                finally:
+                    response.close()
+                stats.record('decode', start)
+
+                # The body is never held in full, so the digest covers the buses shown.
+                digest = None if response.status_code == 304 else hash(tuple(tuple(bus.values()) for bus in buses))
+                cached = response_cache.revalidate(cache_key, response, digest)
+                if cached is not None:
+                    _breaker.success()
+                    log.debug('WMATA bus predictions unchanged.')
+                    return cached
+
+                if log.enabled(log.DEBUG):
+                    log.debug(f'Received {len(buses)} buses to show from WMATA api.')
+
+                # Only the buses shown get normalized.
+                start = stats.now()
+                normalized_results = [BusApi._normalize_bus_response(bus) for bus in buses]
+                stats.record('normalize', start)
+
+                _breaker.success()
+                return response_cache.store(cache_key, response, digest, normalized_results)
+            except (RuntimeError, OSError, ValueError, EOFError) as e:
+                # Catch network-related errors and truncated or garbled responses.
+                log.warning(f'Failed to connect to WMATA API. Error: {e}. Reattempting...')
+                # A half-open circuit allows a single probe, not a round of retries.
+                if _breaker.state == CircuitBreaker.HALF_OPEN:
+                    break
+                if retry_attempt < config['metro_api_retries']:
+                    yield backoff_delay(retry_attempt)
                 retry_attempt += 1
         
         # If all retries fail, raise a custom exception with a descriptive message.
+        _breaker.failure()
         raise MetroApiOnFireException("Failed to fetch bus predictions after multiple retries.")
 
     @staticmethod
-    def _normalize_bus_response(bus: dict) -> dict:
+    def _decode_buses(response, direction_num: str):
+        """
+        Incrementally decodes a NextBus jPredictions response body, read through
+        the shared receive buffer, yielding each bus as soon as it is read.
+        Buses in other directions are dropped as soon as their 'DirectionNum'
+        is read, and only the fields in _BUS_FIELDS are kept.
+        """
+        data = json_stream.load(receive_buffer.chunks(response))
+        # An empty or unexpectedly shaped body is a failed fetch, not an empty list.
+        if not isinstance(data, json_stream.TransientObject):
+            raise ValueError('response is not a JSON object')
+        try:
+            raw_buses = data['Predictions']
+        except KeyError:
+            return
+        if not isinstance(raw_buses, json_stream.TransientList):
+            raise ValueError("'Predictions' is not a list")
+
+        for raw_bus in raw_buses:
+            if not isinstance(raw_bus, json_stream.TransientObject):
+                raise ValueError("'Predictions' holds something other than objects")
+            matched = False
+            bus = {}
+            for key, value in raw_bus.items():
+                if key == 'DirectionNum':
+                    if value != direction_num:
+                        break
+                    matched = True
+                elif key in BusApi._BUS_FIELDS:
+                    bus[key] = value
+
+            if matched:
+                yield bus
+
+    @staticmethod
+    def _bus_key(bus: dict) -> int:
+        """Sort key for a raw bus prediction."""
+        return arrival_key(bus.get('Minutes', ''))
+
+    @staticmethod
+    def _normalize_bus_response(bus: dict) -> Prediction:
         """
         Normalizes the raw bus response from the API into a more consistent format.
         """
@@ -76,12 +246,22 @@ class BusApi:
         if destination in BusApi._DESTINATION_NORMALIZATIONS:
             destination = 'No Psngr'
 
-        return {
-            'line_color': BusApi._get_line_color(line),
-            'destination': destination,
-            'arrival': arrival
-        }
+        return Prediction(
+            BusApi._get_line_color(line),
+            BusApi._destination_text(line, destination),
+            arrival,
+            '-', # Buses have no car count
+            False
+        )
     
+    @staticmethod
+    def _destination_text(route: str, destination: str) -> str:
+        """
+        Returns the destination text shown for a bus: its route, under the
+        heading's RT, followed by the direction.
+        """
+        return f'{route} {destination}' if route else destination
+
     @staticmethod
     def _get_line_color(line: str) -> int:
         """
@@ -89,5 +269,4 @@ class BusApi:
         Uses a dictionary lookup for efficiency and readability
         All bus lines are the default config color
         """
-        # Use .get() with a default value to handle lines not explicitly defined.
-        return config.get("Bus Color", BusApi._DEFAULT_COLOR)
+        return settings.bus_color
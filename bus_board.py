@@ -0,0 +1,17 @@
+from display_board import DisplayBoard, PredictionRow
+from settings import settings
+
+
+class BusBoard(DisplayBoard):
+    """
+    Manages the display of bus prediction entries on a matrix display.
+
+    display is the display shared by all boards; call show() to put this board on it.
+
+    get_new_data is a function that is expected to return a list of predictions
+    as returned by BusApi.fetch_bus_predictions(). Buses have no car count, so
+    their rows are plain PredictionRows and the car field is ignored. The route
+    leads the destination text, under the heading's RT.
+    """
+    def __init__(self, display, get_new_data=None):
+        super().__init__(display, 'bus', settings.bus_heading_text, PredictionRow, get_new_data)
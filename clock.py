@@ -0,0 +1,107 @@
+import time
+
+from config import config
+
+# Signs have no battery-backed clock. The time of day is taken from the Date
+# header of WMATA responses (Transport calls sync()) and kept from then on by
+# the monotonic clock. Where the system clock is already set (a host, or a
+# board whose RTC was set some other way) it is used until then.
+
+DAY = 86400
+# Seconds between syncs from response headers.
+RESYNC_INTERVAL = 3600
+# The system clock counts as set once it is past 2020-01-01.
+_CLOCK_SET_AFTER = 1577836800
+
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# UTC seconds minus monotonic seconds, once synced.
+_offset = None
+_synced_at = None
+
+
+def days_from_civil(year: int, month: int, day: int) -> int:
+    """Returns the number of days from 1970-01-01 to a proleptic Gregorian date."""
+    if month <= 2:
+        year -= 1
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def needs_sync() -> bool:
+    return _synced_at is None or time.monotonic() - _synced_at >= RESYNC_INTERVAL
+
+
+def sync(http_date: str) -> bool:
+    """
+    Sets the clock from an HTTP date such as 'Sun, 06 Nov 1994 08:49:37 GMT'.
+    Returns whether the date could be read.
+    """
+    global _offset, _synced_at
+    try:
+        _, day, month, year, time_of_day, _ = http_date.split(' ')
+        hours, minutes, seconds = time_of_day.split(':')
+        utc = (
+            days_from_civil(int(year), _MONTHS.index(month) + 1, int(day)) * DAY +
+            int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+        )
+    except (AttributeError, ValueError):
+        return False
+    _offset = utc - _monotonic_seconds()
+    _synced_at = time.monotonic()
+    return True
+
+
+def _monotonic_seconds() -> int:
+    # CircuitPython floats are too short for seconds since 1970, so whole
+    # seconds are kept as integers.
+    return time.monotonic_ns() // 1000000000
+
+
+def now() -> int:
+    """Returns the UTC time in whole seconds since 1970, or None if it is not known yet."""
+    if _offset is not None:
+        return _monotonic_seconds() + _offset
+    system = int(time.time())
+    return system if system > _CLOCK_SET_AFTER else None
+
+
+def _is_dst(utc: int, standard_offset: int) -> bool:
+    """
+    Whether US daylight saving time is in effect: from 2:00 local standard time
+    on the second Sunday of March until 2:00 local daylight time on the first
+    Sunday of November.
+    """
+    year = _year_of((utc + standard_offset) // DAY)
+    march_1 = days_from_civil(year, 3, 1)
+    november_1 = days_from_civil(year, 11, 1)
+    # 1970-01-01 was a Thursday; (days + 4) % 7 is 0 on Sundays.
+    start = march_1 + (7 - (march_1 + 4) % 7) % 7 + 7
+    end = november_1 + (7 - (november_1 + 4) % 7) % 7
+    return start * DAY + 7200 - standard_offset <= utc < end * DAY + 3600 - standard_offset
+
+
+def _year_of(days: int) -> int:
+    year = 1970 + days // 366
+    while days_from_civil(year + 1, 1, 1) <= days:
+        year += 1
+    return year
+
+
+def local_day_and_minute() -> tuple:
+    """
+    Returns (days since 1970, minute of the day) in local time, using
+    config['utc_offset_hours'] and, when config['daylight_saving'] is set,
+    US daylight saving rules. Returns None if the time is not known yet.
+    """
+    utc = now()
+    if utc is None:
+        return None
+    offset = int(config['utc_offset_hours'] * 3600)
+    if config['daylight_saving'] and _is_dst(utc, offset):
+        offset += 3600
+    local = utc + offset
+    return local // DAY, (local % DAY) // 60
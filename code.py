@@ -1,72 +1,150 @@
 # DC Metro Board
 import time
+BOOT_START = time.monotonic()
+
+import log
+from config import config
+from fonts import preload_glyphs
+from adafruit_matrixportal.matrix import Matrix
+from train_board import TrainBoard
+
+# (phase, seconds since boot) for every startup phase, to track time-to-first-prediction.
+boot_timings = []
+
+def boot_phase(name: str):
+	"""
+	Records and prints how long after boot a startup phase finished.
+	"""
+	elapsed = time.monotonic() - BOOT_START
+	boot_timings.append((name, elapsed))
+	log.info(f'Boot: {name} after {elapsed:.2f} s')
+
+# Put the loading screen up before anything else is imported or initialized.
+# Only the glyphs of the heading and loading texts are parsed for it.
+display = Matrix().display
+train_board = TrainBoard(display)
+train_board.show()
+boot_phase('loading screen')
+
+# Both boards' group trees are built once; switching only swaps the root group.
+from bus_board import BusBoard
+bus_board = BusBoard(display)
+
+# Parse every glyph the board can show now, so no refresh has to read the BDF file.
+preload_glyphs()
+boot_phase('glyphs')
+
+import sys
+import asyncio
 import board
+import supervisor
 
 from digitalio import DigitalInOut, Pull
 from adafruit_debouncer import Debouncer
-from config import config
-from train_board import TrainBoard
+from prediction import Prediction
+from scheduler import SignState, dump_stats, tasks
 from metro_api import MetroApi, MetroApiOnFireException
+from bus_api import BusApi
+from bus_api import MetroApiOnFireException as BusApiOnFireException
+
+# The network itself is only brought up by the first fetch.
+boot_phase('imports')
 
 STATION_CODE = config['metro_station_code']
 TRAIN_GROUP = config['train_group']
-REFRESH_INTERVAL = config['refresh_interval']
+STATS_HOLD_SECONDS = config['stats_hold_seconds']
+STATS_SERIAL_COMMAND = config['stats_serial_command']
+SERIAL_POLL_INTERVAL = 0.2
+AGGREGATOR_HOST = config['aggregator_host']
+
+# With an aggregator on the LAN predictions arrive as frames instead of being fetched from WMATA.
+train_feed = None
+bus_feed = None
+if AGGREGATOR_HOST:
+	from aggregator_client import AggregatorClient
+	from frame import bus_channel, metro_channel
+	from transport import get_udp_socket
+	open_aggregator_socket = lambda: get_udp_socket(AGGREGATOR_HOST, config['aggregator_port'])
+	train_feed = AggregatorClient(open_aggregator_socket, metro_channel(STATION_CODE, TRAIN_GROUP), config['aggregator_timeout'])
+	bus_feed = AggregatorClient(open_aggregator_socket, bus_channel(config['bus_stop_id'], config['bus_direction_num']), config['aggregator_timeout'])
+feeds = [train_feed, bus_feed]
 
-CURRENT_BOARD = 0
 board_list = ['metro', 'bus']
 
-def refresh_trains() -> list[dict]:
+async def refresh_trains() -> list[Prediction]:
+	if train_feed is not None:
+		return train_feed.poll()
 	try:
-		return MetroApi.fetch_train_predictions(STATION_CODE, TRAIN_GROUP)
+		return await MetroApi.fetch_train_predictions_async(STATION_CODE, TRAIN_GROUP)
 	except MetroApiOnFireException:
-		print('WMATA Api is currently on fire. Trying again later ...')
+		log.warning('WMATA Api is currently on fire. Trying again later ...')
 		return None
 
-train_board = TrainBoard(refresh_trains)
+async def refresh_buses() -> list[Prediction]:
+	if bus_feed is not None:
+		return bus_feed.poll()
+	try:
+		return await BusApi.fetch_bus_predictions_async(config['bus_stop_id'], config['bus_direction_num'])
+	except BusApiOnFireException:
+		log.warning('WMATA Bus Api is currently on fire. Trying again later ...')
+		return None
 
-def board_switch():
-	"""
-	Switches the current board being displayed.
-	Cycles through the available boards in `board_list`.
-	"""
-	CURRENT_BOARD = (CURRENT_BOARD + 1) % len(board_list)
-	print(f'Switched to {board_list[CURRENT_BOARD]} board.')
+def scheduled_trains() -> list[Prediction]:
+	return MetroApi.fetch_scheduled_departures(STATION_CODE, TRAIN_GROUP)
+
+def scheduled_buses() -> list[Prediction]:
+	return BusApi.fetch_scheduled_departures(config['bus_stop_id'], config['bus_direction_num'])
 
-def metrosign():
+fetchers = [refresh_trains, refresh_buses]
+# Used once live predictions have been unavailable for longer than STALE_MAX_AGE.
+timetables = [scheduled_trains, scheduled_buses]
+boards = [train_board, bus_board]
+
+async def serial_task():
 	"""
-	Function to run the MetroSign application.
-	This function is called when the script is run directly.
+	Reads commands typed on the serial console:
+	STATS_SERIAL_COMMAND dumps timing stats and "log <level>" changes the log level.
 	"""
-	print('MetroSign is running...')
-	print(f'Fetching train predictions for station: {STATION_CODE}, group: {TRAIN_GROUP}')
-	print(f'Refreshing every {REFRESH_INTERVAL} seconds.')
-	while CURRENT_BOARD == 0:
-		train_board.refresh()
-		time.sleep(REFRESH_INTERVAL)
-
-def bussign():
+	line = ''
+	while True:
+		available = supervisor.runtime.serial_bytes_available
+		if available:
+			line += sys.stdin.read(available)
+			while '\n' in line or '\r' in line:
+				end = min(i for i in (line.find('\n'), line.find('\r')) if i >= 0)
+				command = line[:end].strip()
+				line = line[end + 1:]
+
+				if command == STATS_SERIAL_COMMAND:
+					dump_stats()
+				elif command.startswith('log '):
+					if log.set_level(command[4:].strip()):
+						print(f'Log level set to {command[4:].strip()}.')
+					else:
+						print('Unknown log level. Use error, warning, info or debug.')
+		await asyncio.sleep(SERIAL_POLL_INTERVAL)
+
+async def main():
 	"""
-	Function to run the BusSign application.
-	This function is called when the script is run directly.
+	Runs the MetroSign application as independent cooperative tasks.
 	"""
-	print('BusSign is running...')
-	print(f'Fetching bus predictions for stop ID: {config["bus_stop_id"]}, direction: {config["bus_direction_num"]}')
-	while CURRENT_BOARD == 1:
-		# Placeholder for bus sign functionality
-		print('Bus sign functionality not implemented yet.')
-		time.sleep(REFRESH_INTERVAL)
-
-global button_a_pin
-button_a_pin = DigitalInOut(board.BUTTON_UP)
-button_a_pin.switch_to_input(Pull.UP)
-button_a = Debouncer(button_a_pin)
-
-while True:
-	button_a.update()
-	if button_a.fell:
-		board_switch()
-		if CURRENT_BOARD == 0:
-			metrosign()
-		elif CURRENT_BOARD == 1:
-			bussign()
-	
+	log.info('MetroSign is running...')
+	log.info(f'Fetching train predictions for station: {STATION_CODE}, group: {TRAIN_GROUP}')
+	log.info(f'Fetching bus predictions for stop ID: {config["bus_stop_id"]}, direction: {config["bus_direction_num"]}')
+	if AGGREGATOR_HOST:
+		log.info(f'Receiving predictions from the aggregator at {AGGREGATOR_HOST}:{config["aggregator_port"]}.')
+	else:
+		log.info(f'Refreshing every {config["refresh_interval_fast"]} to {config["refresh_interval_idle"]} seconds.')
+	log.info(f'Hold the button for {STATS_HOLD_SECONDS} s or type "{STATS_SERIAL_COMMAND}" for timing stats, "log <level>" to change logging.')
+
+	button_a_pin = DigitalInOut(board.BUTTON_UP)
+	button_a_pin.switch_to_input(Pull.UP)
+	button_a = Debouncer(button_a_pin)
+
+	state = SignState(board_list, boards, fetchers, timetables, feeds)
+	await asyncio.gather(
+		serial_task(),
+		*tasks(state, button_a, lambda: boot_phase('first prediction'))
+	)
+
+asyncio.run(main())
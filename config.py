@@ -1,4 +1,3 @@
-from adafruit_bitmap_font import bitmap_font # type: ignore
 import json
 ''' Load WiFi and API key from a separate txt file
 # This file should contain the following structure:
@@ -32,6 +31,8 @@ config = {
 	#########################
 
 	# Metro Station Code
+	# Note: You can list several stations, e.g. ['A01', 'C01'] for both levels of Metro Center.
+	# They are fetched in a single request and shown together ordered by arrival.
 	'metro_station_code': 'E01',
 
 	# Metro Train Group
@@ -51,6 +52,7 @@ config = {
 	
 	#Bus Stop IDs
     # Note: You can have more than one bus stop ID, which can be found on the WMATA website.
+    # List them like ['1001344', '1001345']; their buses are shown together ordered by arrival.
     'bus_stop_id': '1001344',
     
 	"bus_direction_num": '0', # Direction number for the bus stop, usually 0 or 1
@@ -65,27 +67,80 @@ config = {
 	#########################
 	'metro_api_url': 'https://api.wmata.com/StationPrediction.svc/json/GetPrediction/',
 	'metro_api_retries': 2,
-	'refresh_interval': 5, # 5 seconds is a good middle ground for updates, as the processor takes its sweet ol time
+	'receive_buffer_size': 256, # Bytes read from the socket at a time; one buffer this size is reused for every response
+	'response_cache_ttl': 10, # Seconds a fetched result is reused before WMATA is asked again (WMATA updates roughly every 20 seconds)
+	# Minutes shown count down locally between fetches, so WMATA is only polled
+	# as often as the nearest arrival needs. Intervals are in seconds.
+	'refresh_interval': 20, # Normal interval between fetches
+	'refresh_interval_fast': 10, # Used when something arrives in under refresh_fast_below_minutes
+	'refresh_interval_slow': 60, # Used when nothing arrives for refresh_slow_from_minutes
+	'refresh_interval_idle': 300, # Used when nothing is scheduled, e.g. late at night
+	'refresh_fast_below_minutes': 2,
+	'refresh_slow_from_minutes': 15,
+	'button_poll_interval': 0.01, # Seconds between button reads
+	'render_interval': 0.1, # Seconds between checks for new data to draw
     
-	'bus_api_url': 'http://api.wmata.com/NextBusService.svc/json/jPredictions?',
+	'bus_api_url': 'https://api.wmata.com/NextBusService.svc/json/jPredictions?StopID=',
 	'bus_api_retries': 2,
+	'http_timeout': 10, # Seconds to wait for WMATA before a request counts as failed
+
+	# Aggregator (aggregator.py)
+	# Set aggregator_host to the address of a host running aggregator.py to get
+	# predictions from it instead of polling WMATA from every sign.
+	'aggregator_host': None,
+	'aggregator_port': 9595,
+	'aggregator_poll_interval': 1, # Seconds between checks for new frames
+	'aggregator_timeout': 120, # Seconds without a frame before the aggregator counts as down
+
+	# WMATA API quota (the free tier allows 10 calls a second and 50,000 a day)
+	# Every sign using the same API key shares it, so lower these accordingly.
+	'quota_per_second': 10,
+	'quota_per_day': 50000,
+	'quota_burst': 1, # Requests allowed back to back; 1 spaces every request 1/quota_per_second apart
+
+	# Outage handling
+	'backoff_base': 0.5, # Seconds before the first retry; doubles with each retry, with random jitter
+	'backoff_max': 4, # Longest wait between retries, in seconds
+	'circuit_failure_threshold': 3, # Failed fetches in a row before WMATA is left alone
+	'circuit_reset_timeout': 60, # Seconds before a single probe request is tried again
+	'stale_max_age': 600, # Seconds the last good predictions keep being shown (counting down) while WMATA is down
+	'stale_heading_color': 0x0000FF, # Heading color while stale predictions are shown
+
+	# Timetable fallback
+	# Once stale_max_age has passed without live predictions, departures are taken
+	# from a timetable built from WMATA's GTFS feeds with build_schedule.py.
+	'schedule_path': 'schedule.bin', # None to show nothing instead
+	'schedule_horizon_minutes': 90, # Scheduled departures further away than this are not shown
+	'schedule_train_directions': {'1': 0, '2': 1}, # Train group -> GTFS direction_id
+	# Local time for the timetable. The time itself comes from WMATA's responses.
+	'utc_offset_hours': -5, # Eastern Standard Time
+	'daylight_saving': True, # Add an hour during US daylight saving time
+
+	# Diagnostics
+	'log_level': 'info', # 'error', 'warning', 'info' or 'debug'
+	'stats_buffer_size': 64, # Samples kept per timing probe
+	'stats_hold_seconds': 2, # Holding the button this long dumps timing stats instead of switching boards
+	'stats_serial_command': 'stats', # Typing this on the serial console dumps timing stats
+	'sample_largest_free_block': True, # Also probe the largest allocatable block after each collection (a few ms)
 
 	# Display Settings
 	'matrix_width': 64,
 	'num_trains': 3,
-	'font': bitmap_font.load_font('lib/5x7.bdf'),
+	'font_path': 'lib/5x7.bdf', # Loaded once, on first use, by fonts.get_font()
 
 	'character_width': 5,
 	'character_height': 7,
 	'text_padding': 1,
 	'text_color': 0xFF7500,
     'text_color_8_car_train': 0x00FF00, # Green color for 8 car trains 
+	'text_color_scheduled': 0x00A0FF, # Arrival times taken from the timetable rather than live predictions
 
 	'loading_destination_text': 'Loading',
 	'loading_min_text': '---',
 	'loading_line_color': 0xFF00FF, # Something something Purple Line joke
 
 	'heading_text': 'LN DEST   MIN',
+	'bus_heading_text': 'RT DEST   MIN',
 	'heading_color': 0xFF0000,
 
 	'train_line_height': 6,
@@ -93,4 +148,10 @@ config = {
 
 	'min_label_characters': 3,
 	'destination_max_characters': 8,
+
+	# Destinations longer than destination_max_characters scroll instead of being cut off.
+	'scroll_destinations': True,
+	'scroll_fps': 15, # Scroll speed in pixels (frames) per second
+	'scroll_gap': 12, # Blank pixels between the end of a scrolling destination and its start
+	'text_cache_bytes': 4096, # Heap for cached rendered destinations and arrival times
 }
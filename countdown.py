@@ -0,0 +1,65 @@
+from config import config
+from quota import quota
+
+# Arrival strings that mean the train or bus is already at the platform.
+_AT_PLATFORM = {'ARR', 'BRD'}
+
+
+def age_arrival(arrival, elapsed: float):
+    """
+    Returns an arrival prediction aged locally by `elapsed` seconds.
+    Numeric minutes count down and become 'ARR' once they reach zero;
+    'ARR', 'BRD', '---' and blanks are returned unchanged.
+    """
+    if elapsed < 60:
+        return arrival
+
+    try:
+        minutes = int(arrival)
+    except (TypeError, ValueError):
+        return arrival
+
+    minutes -= int(elapsed // 60)
+    if minutes <= 0:
+        return 'ARR'
+    # Bus predictions are integers, train predictions are strings.
+    return minutes if isinstance(arrival, int) else str(minutes)
+
+
+def poll_interval(predictions: list) -> float:
+    """
+    Returns how long to wait before fetching predictions again.
+    Polls fast when something is about to arrive, slowly when the next
+    arrival is far away, and very slowly when nothing is scheduled at all
+    (late at night WMATA returns an empty list). Intervals are stretched
+    while requests are running ahead of the daily API quota.
+    """
+    return _arrival_interval(predictions) * quota.interval_scale()
+
+
+def _arrival_interval(predictions: list) -> float:
+    if predictions is None:
+        return config['refresh_interval']
+    if not predictions:
+        return config['refresh_interval_idle']
+
+    nearest = None
+    for prediction in predictions:
+        arrival = prediction.arrival
+        if arrival in _AT_PLATFORM:
+            minutes = 0
+        else:
+            try:
+                minutes = int(arrival)
+            except (TypeError, ValueError):
+                continue
+        if nearest is None or minutes < nearest:
+            nearest = minutes
+
+    if nearest is None:
+        return config['refresh_interval']
+    if nearest < config['refresh_fast_below_minutes']:
+        return config['refresh_interval_fast']
+    if nearest >= config['refresh_slow_from_minutes']:
+        return config['refresh_interval_slow']
+    return config['refresh_interval']
@@ -0,0 +1,253 @@
+import displayio
+from adafruit_display_text.label import Label
+
+import log
+from countdown import age_arrival
+from fonts import get_font
+from line_palette import line_bars, line_color_index
+from marquee import Marquee, TextField
+from prediction import Prediction
+from settings import settings
+from stats import stats
+from text_bitmap import TEXT_COLOR, TEXT_COLOR_SCHEDULED
+
+
+class DisplayBoard:
+    """
+    A heading over settings.num_trains prediction rows, drawn on a display
+    shared with the other boards.
+
+    The whole display group tree is built once, up front. show() only swaps
+    this board's root group onto the display, so switching boards is constant
+    time, allocates nothing and keeps every row exactly as it was last rendered.
+
+    Subclasses pick the heading text and the row class, which must provide
+    show(), hide() and update_prediction().
+    """
+    def __init__(self, display, name: str, heading_text: str, row_class, get_new_data=None):
+        self.display = display
+        self.name = name
+        self.get_new_data = get_new_data
+
+        # A single parent group to hold all display elements.
+        # Max size is num_trains (for row groups) + 1 (for heading_label) + 1 (for line_bars).
+        self.parent_group = displayio.Group(max_size=settings.num_trains + 2)
+
+        # Initialize and add the heading label to the parent group.
+        self.heading_label = Label(get_font(), max_glyphs=len(heading_text), anchor_point=(0,0))
+        self.heading_label.color = settings.heading_color
+        self.heading_label.text = heading_text
+        self.parent_group.append(self.heading_label)
+
+        # The line indicators of all rows are the tiles of a single TileGrid.
+        self.line_bars = line_bars()
+        self.parent_group.append(self.line_bars)
+
+        # Create and store the rows.
+        self.rows = [row_class(self.parent_group, i, self.line_bars) for i in range(settings.num_trains)]
+
+        # Number of displayio writes made by the last refresh.
+        self.display_writes = 0
+
+        # The list last rendered and the whole minutes it was aged by; the APIs
+        # return the same list object when nothing changed.
+        self._rendered_data = None
+        self._rendered_age = 0
+
+        # Whether the heading currently marks the predictions as stale.
+        self._stale = False
+
+    def show(self):
+        """Puts this board's group tree on the display."""
+        start = stats.now()
+        self.display.show(self.parent_group)
+        stats.record('switch', start)
+
+    def refresh(self) -> bool:
+        """
+        Fetches new data and updates the display.
+        """
+        if log.enabled(log.DEBUG):
+            log.debug(f'Refreshing {self.name} information...')
+        return self.render(self.get_new_data())
+
+    def render(self, data: list[Prediction], age: float = 0, stale: bool = False) -> bool:
+        """
+        Updates the rows with already fetched predictions, counting arrival
+        minutes down locally by `age`, the seconds since the data was fetched.
+        `stale` marks data kept from before an API outage by recoloring the heading.
+        Hides rows if no data is available or if there's less data than display slots.
+        Only display elements whose values changed are written; the number of
+        writes made is kept in `display_writes`.
+        """
+        age_minutes = int(age // 60)
+        if (data is not None and data is self._rendered_data and
+                age_minutes == self._rendered_age and stale == self._stale):
+            self.display_writes = 0
+            return True
+        self._rendered_data = data
+        self._rendered_age = age_minutes
+
+        render_start = stats.now()
+
+        if data is None:
+            log.info('No data received. Clearing display.')
+            data = [] # Treat no data as an empty list for consistent processing
+
+        log.debug('Reply received.' if data else 'No data received.')
+
+        display_writes = self.set_stale(stale)
+
+        # Iterate through all available display slots.
+        for i in range(settings.num_trains):
+            if i < len(data):
+                # If there's data for this slot, update the row.
+                start = stats.now()
+                display_writes += self.rows[i].update_prediction(data[i], age_arrival(data[i].arrival, age))
+                stats.record('update', start)
+            else:
+                # If no data for this slot, hide the row.
+                display_writes += self.rows[i].hide()
+
+        self.display_writes = display_writes
+        stats.record('render', render_start)
+        if log.enabled(log.DEBUG):
+            log.debug(f'Successfully updated ({display_writes} display writes).' if data else 'Display cleared.')
+        return data is not None # Return True if data was received, False otherwise.
+
+    def scroll(self) -> int:
+        """
+        Advances every scrolling destination by one frame.
+        Returns the number of display writes made.
+        """
+        display_writes = 0
+        for row in self.rows:
+            display_writes += row.scroll()
+        return display_writes
+
+    def set_stale(self, stale: bool) -> int:
+        """Colors the heading to show whether the predictions are stale."""
+        if stale == self._stale:
+            return 0
+        self.heading_label.color = settings.stale_heading_color if stale else settings.heading_color
+        self._stale = stale
+        return 1
+
+
+class PredictionRow:
+    """
+    A single prediction entry on the display: a line color bar, the
+    destination and the arrival time. The line color bar is this row's tile
+    in the board's shared `line_bars` TileGrid.
+
+    The last rendered value of every display element is remembered so that
+    setters only touch displayio objects when the value actually changes.
+    Each setter returns the number of display writes it made (0 or 1).
+    """
+    def __init__(self, parent_group: displayio.Group, index: int, line_bars: displayio.TileGrid):
+        # Y position for this entry.
+        y = settings.slot_y[index]
+
+        # The line color bar starts out showing the loading color.
+        self.line_bars = line_bars
+        self.index = index
+
+        # Initialize the destination, which scrolls when it is too long to fit.
+        self.destination = Marquee(settings.destination_x, y, settings.destination_width, settings.loading_destination_text)
+
+        # Initialize the minutes field (arrival time).
+        self.minutes = TextField(settings.min_label_x, y, settings.min_label_width, settings.loading_min_text)
+
+        # Group all elements for this entry for easy management.
+        self.group = displayio.Group(max_size=2) # Contains destination, minutes
+        self.group.append(self.destination.tile_grid)
+        self.group.append(self.minutes.tile_grid)
+
+        # Last rendered state, mirroring what was written above.
+        self._hidden = False
+        self._line_tile = line_color_index(settings.loading_line_color)
+        self._destination = settings.loading_destination_text
+        self._min_text = settings.loading_min_text
+        self._min_color = TEXT_COLOR
+
+        # Add this entry's group to the board's parent group.
+        parent_group.append(self.group)
+
+    def show(self) -> int:
+        """Makes the entry visible. The line color bar reappears with the next set_line_color()."""
+        if not self._hidden:
+            return 0
+        self.group.hidden = False
+        self._hidden = False
+        return 1
+
+    def hide(self) -> int:
+        """Hides the entry, blanking its line color bar."""
+        if self._hidden:
+            return 0
+        self.group.hidden = True
+        self._hidden = True
+        return 1 + self._set_line_tile(0)
+
+    def set_line_color(self, line_color: int) -> int:
+        """Sets the color of the line bar."""
+        return self._set_line_tile(line_color_index(line_color))
+
+    def _set_line_tile(self, tile: int) -> int:
+        if tile == self._line_tile:
+            return 0
+        self.line_bars[0, self.index] = tile
+        self._line_tile = tile
+        return 1
+
+    def set_destination(self, destination: str) -> int:
+        """Sets the destination text, truncating it if too long unless scrolling is enabled."""
+        if destination == self._destination:
+            return 0
+        self.destination.set_text(destination)
+        self._destination = destination
+        return 1
+
+    def scroll(self) -> int:
+        """Scrolls the destination by one pixel if it is visible and too long to fit."""
+        if self._hidden:
+            return 0
+        return self.destination.scroll()
+
+    def set_arrival_time(self, minutes: str, color_index: int = TEXT_COLOR) -> int:
+        """
+        Sets the arrival time, ensuring it's a string and right-justified,
+        drawn in the color at `color_index` of the text palette.
+        """
+        # Common values come right-justified from a precomputed table.
+        min_str = settings.minutes_text.get(minutes)
+        if min_str is None:
+            # Convert to string and right-justify with spaces for consistent alignment.
+            min_chars = settings.min_label_characters
+            min_str = str(minutes)
+            if len(min_str) < min_chars:
+                min_str = ' ' * (min_chars - len(min_str)) + min_str
+
+        if min_str == self._min_text and color_index == self._min_color:
+            return 0
+        self.minutes.set_text(min_str, color_index)
+        self._min_text = min_str
+        self._min_color = color_index
+        return 1
+
+    def update(self, line_color: int, destination: str, minutes: str, scheduled: bool = False) -> int:
+        """
+        Updates all display elements for this entry. Arrival times from the
+        timetable (`scheduled`) are drawn in the scheduled text color.
+        Returns the number of display writes that were needed.
+        """
+        return (
+            self.show() + # Ensure the entry is visible before updating.
+            self.set_line_color(line_color) +
+            self.set_destination(destination) +
+            self.set_arrival_time(minutes, TEXT_COLOR_SCHEDULED if scheduled else TEXT_COLOR)
+        )
+
+    def update_prediction(self, prediction: Prediction, minutes) -> int:
+        """Updates the entry from `prediction`, showing `minutes` as its arrival time."""
+        return self.update(prediction.line_color, prediction.destination, minutes, prediction.scheduled)
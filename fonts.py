@@ -0,0 +1,38 @@
+from config import config
+from settings import settings
+
+# Every character the boards can show: the headings and loading texts, digits and
+# ARR/BRD/--- for arrivals, and the letters and punctuation used in station
+# names and bus directions.
+DISPLAY_CHARACTERS = (
+    settings.heading_text +
+    settings.bus_heading_text +
+    settings.loading_destination_text +
+    settings.loading_min_text +
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZ' +
+    'abcdefghijklmnopqrstuvwxyz' +
+    '0123456789' +
+    " -./'&"
+)
+
+_font = None
+
+
+def get_font():
+    """
+    Returns the board font, loading it on first use.
+    Glyphs are parsed from the BDF file lazily unless preloaded.
+    """
+    global _font
+    if _font is None:
+        from adafruit_bitmap_font import bitmap_font # type: ignore
+        _font = bitmap_font.load_font(config['font_path'])
+    return _font
+
+
+def preload_glyphs(characters: str = DISPLAY_CHARACTERS):
+    """
+    Parses the glyphs for `characters` up front so that rendering new text
+    never has to read the BDF file mid-refresh.
+    """
+    get_font().load_glyphs(characters)
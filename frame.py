@@ -0,0 +1,209 @@
+import struct
+
+from prediction import Prediction
+
+# Binary frames exchanged between the aggregator (aggregator.py) and signs
+# (aggregator_client.py) over UDP. All integers are big-endian.
+#
+# Every datagram starts with a header:
+#     magic    2s  b'MS'
+#     version  B   VERSION
+#     type     B   FULL, DELTA or SUBSCRIBE
+#     sequence H   frame number within the channel, wrapping at 65536
+#     count    B   number of predictions in the channel after this frame
+#     length   B   length of the channel name that follows
+#     channel      channel name, e.g. b'metro:E01:1' or b'bus:1001344:0'
+#
+# A FULL frame is followed by `count` records. A DELTA frame applies to the
+# frame numbered sequence - 1 and is followed by the number of changed slots
+# (B), then a slot index (B) and a record for each. A SUBSCRIBE datagram, sent
+# by a sign, has no body and asks for the channel's frames for
+# SUBSCRIPTION_TTL seconds.
+#
+# Each record has a fixed layout:
+#     red, green, blue  BBB  line color
+#     arrival           B    minutes (0-239) or one of the ARRIVAL_CODES
+#     kind              B    KIND_MINUTES_STR (trains) or KIND_MINUTES_INT (buses),
+#                            plus KIND_SCHEDULED for departures from the timetable
+#     car               B    number of cars, 0 when unknown
+#     destination       40s  UTF-8, NUL padded, long enough for bus routes and directions;
+#                            longer ones are cut at a character boundary
+
+MAGIC = b'MS'
+VERSION = 2
+
+FULL = 1
+DELTA = 2
+SUBSCRIBE = 3
+
+# Seconds a subscription lasts unless it is renewed.
+SUBSCRIPTION_TTL = 60
+# Seconds between subscription attempts while no frame has arrived, since
+# UDP may have dropped the subscription or its reply.
+SUBSCRIBE_RETRY = 2
+
+HEADER = struct.Struct('>2sBBHBB')
+RECORD = struct.Struct('>BBBBBB40s')
+
+KIND_MINUTES_STR = 0
+KIND_MINUTES_INT = 1
+KIND_SCHEDULED = 0x80
+
+_MAX_MINUTES = 239
+ARRIVAL_CODES = {'ARR': 250, 'BRD': 251, '---': 252, '': 253}
+_ARRIVAL_TEXT = {code: text for text, code in ARRIVAL_CODES.items()}
+
+_DESTINATION_BYTES = RECORD.size - 6
+
+
+def frame_size(slots: int) -> int:
+    """Returns the largest datagram a channel of up to `slots` predictions can send."""
+    return HEADER.size + 255 + 1 + slots * (1 + RECORD.size)
+
+
+def _codes(codes) -> str:
+    return codes if isinstance(codes, str) else ','.join(codes)
+
+
+def metro_channel(station_code, group: str) -> bytes:
+    """Returns the channel name for trains of `group` at one or more stations."""
+    return f'metro:{_codes(station_code)}:{group}'.encode()
+
+
+def bus_channel(stop_id, direction_num: str) -> bytes:
+    """Returns the channel name for buses in `direction_num` at one or more stops."""
+    return f'bus:{_codes(stop_id)}:{direction_num}'.encode()
+
+
+def encode_record(prediction: Prediction) -> bytes:
+    """Packs a prediction into a fixed-size record."""
+    arrival = prediction.arrival
+    kind = KIND_MINUTES_INT if isinstance(arrival, int) else KIND_MINUTES_STR
+    code = ARRIVAL_CODES.get(arrival) if kind == KIND_MINUTES_STR else None
+    if code is None:
+        try:
+            code = min(max(int(arrival), 0), _MAX_MINUTES)
+        except ValueError:
+            # Unknown arrival text is shown as no prediction.
+            code = ARRIVAL_CODES['---']
+
+    try:
+        car = int(prediction.car)
+    except ValueError:
+        car = 0
+
+    destination = prediction.destination.encode('utf-8')
+    if len(destination) > _DESTINATION_BYTES:
+        # Cut at a character boundary: back up while the first byte dropped
+        # continues a multi-byte character.
+        end = _DESTINATION_BYTES
+        while end and destination[end] & 0xC0 == 0x80:
+            end -= 1
+        destination = destination[:end]
+
+    color = prediction.line_color
+    return RECORD.pack(
+        (color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF,
+        code, kind | (KIND_SCHEDULED if prediction.scheduled else 0), car,
+        destination
+    )
+
+
+def decode_record(data, offset: int) -> Prediction:
+    """Unpacks the record at `offset` of `data` into a prediction."""
+    red, green, blue, code, kind, car, destination = RECORD.unpack_from(data, offset)
+    scheduled = bool(kind & KIND_SCHEDULED)
+    kind &= ~KIND_SCHEDULED
+
+    arrival = _ARRIVAL_TEXT.get(code)
+    if arrival is None:
+        arrival = code if kind == KIND_MINUTES_INT else str(code)
+
+    end = destination.find(b'\x00')
+    if end >= 0:
+        destination = destination[:end]
+
+    return Prediction(
+        (red << 16) | (green << 8) | blue,
+        destination.decode('utf-8'),
+        arrival,
+        str(car) if car else '-',
+        scheduled
+    )
+
+
+def _header(frame_type: int, channel: bytes, sequence: int, count: int) -> bytes:
+    return HEADER.pack(MAGIC, VERSION, frame_type, sequence & 0xFFFF, count, len(channel)) + channel
+
+
+def encode_subscribe(channel: bytes) -> bytes:
+    return _header(SUBSCRIBE, channel, 0, 0)
+
+
+def encode_full(channel: bytes, sequence: int, records: list) -> bytes:
+    """Builds a FULL frame from records made by encode_record()."""
+    return _header(FULL, channel, sequence, len(records)) + b''.join(records)
+
+
+def encode_delta(channel: bytes, sequence: int, previous: list, records: list) -> bytes:
+    """
+    Builds a DELTA frame that turns the `previous` records into `records`,
+    or returns None when a FULL frame would not be larger.
+    """
+    changes = []
+    for slot, record in enumerate(records):
+        if slot >= len(previous) or previous[slot] != record:
+            changes.append(bytes((slot,)) + record)
+    if len(changes) >= len(records):
+        return None
+    return _header(DELTA, channel, sequence, len(records)) + bytes((len(changes),)) + b''.join(changes)
+
+
+def decode_header(data) -> tuple:
+    """
+    Returns (type, channel, sequence, count, body offset) for a datagram,
+    or None if it is not a frame of this version.
+    """
+    if len(data) < HEADER.size:
+        return None
+    magic, version, frame_type, sequence, count, length = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or len(data) < HEADER.size + length:
+        return None
+    channel = bytes(data[HEADER.size:HEADER.size + length])
+    return frame_type, channel, sequence, count, HEADER.size + length
+
+
+def apply_frame(data, header: tuple, current: list, last_sequence: int):
+    """
+    Applies a FULL or DELTA frame to the `current` predictions.
+    Returns the new list, `current` itself when the frame changed nothing, or
+    None when the frame is truncated or a DELTA does not follow `last_sequence`,
+    in which case a FULL frame is needed.
+    """
+    frame_type, _, sequence, count, offset = header
+    if frame_type == FULL:
+        if len(data) < offset + count * RECORD.size:
+            return None
+        predictions = [decode_record(data, offset + i * RECORD.size) for i in range(count)]
+        if current is not None and predictions == current:
+            return current
+        return predictions
+
+    if frame_type != DELTA or current is None or sequence != (last_sequence + 1) & 0xFFFF:
+        return None
+    if len(data) <= offset or len(data) < offset + 1 + data[offset] * (1 + RECORD.size):
+        return None
+    changed = data[offset]
+    if not changed and count == len(current):
+        return current
+    predictions = current[:count]
+    offset += 1
+    for _ in range(changed):
+        slot = data[offset]
+        prediction = decode_record(data, offset + 1)
+        if slot < len(predictions):
+            predictions[slot] = prediction
+        else:
+            predictions.append(prediction)
+        offset += 1 + RECORD.size
+    return predictions
@@ -0,0 +1,12 @@
+# Line indicator color for each WMATA line code, shared by MetroApi and the
+# line indicator palette. Kept free of display imports so the API modules
+# also run on a host.
+LINE_COLORS = {
+    'RD': 0xFF0000,  # Red
+    'OR': 0xFF5500,  # Orange
+    'YL': 0xFFFF00,  # Yellow
+    'GR': 0x00FF00,  # Green
+    'BL': 0x0000FF,  # Blue
+    'SV': 0xC0C0C0,  # Silver (commonly used, added for completeness)
+}
+DEFAULT_LINE_COLOR = 0xAAAAAA # Default color for unknown lines
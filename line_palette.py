@@ -0,0 +1,55 @@
+import displayio
+
+from line_colors import DEFAULT_LINE_COLOR, LINE_COLORS
+from settings import settings
+
+# Every color a line indicator can take. Index 0 is transparent and used for
+# hidden rows, so a row's indicator is drawn by a single tile index.
+_COLORS = [None]
+for _color in (settings.loading_line_color,) + tuple(LINE_COLORS.values()) + (DEFAULT_LINE_COLOR, settings.bus_color):
+    if _color not in _COLORS:
+        _COLORS.append(_color)
+
+# Line color -> palette index, shared by every row on every board.
+LINE_COLOR_INDEX = {color: index for index, color in enumerate(_COLORS) if index}
+
+LINE_PALETTE = displayio.Palette(len(_COLORS))
+LINE_PALETTE.make_transparent(0)
+for _index in LINE_COLOR_INDEX.values():
+    LINE_PALETTE[_index] = _COLORS[_index]
+
+# One tile per palette entry, as tall as a row, with the indicator filling
+# its top train_line_height lines.
+_ROW_PITCH = settings.character_height + settings.text_padding
+_TILES = displayio.Bitmap(settings.train_line_width * len(_COLORS), _ROW_PITCH, len(_COLORS))
+for _index in LINE_COLOR_INDEX.values():
+    for _x in range(_index * settings.train_line_width, (_index + 1) * settings.train_line_width):
+        for _y in range(min(settings.train_line_height, _ROW_PITCH)):
+            _TILES[_x, _y] = _index
+
+
+def line_color_index(line_color: int) -> int:
+    """Returns the palette index of `line_color`, or of the default line color if it has none."""
+    index = LINE_COLOR_INDEX.get(line_color)
+    if index is None:
+        index = LINE_COLOR_INDEX[DEFAULT_LINE_COLOR]
+    return index
+
+
+def line_bars():
+    """
+    Returns a TileGrid of the line indicators for a board's settings.num_trains
+    rows: one tile per row, all drawn from the shared LINE_PALETTE. Setting a
+    row's tile index to a line_color_index() recolors its indicator.
+    """
+    return displayio.TileGrid(
+        _TILES,
+        pixel_shader=LINE_PALETTE,
+        width=1,
+        height=settings.num_trains,
+        tile_width=settings.train_line_width,
+        tile_height=_ROW_PITCH,
+        default_tile=LINE_COLOR_INDEX[settings.loading_line_color],
+        x=0,
+        y=settings.slot_y[0],
+    )
@@ -0,0 +1,50 @@
+from config import config
+
+# Log levels, from least to most verbose.
+ERROR = 0
+WARNING = 1
+INFO = 2
+DEBUG = 3
+
+_LEVELS = {
+    'error': ERROR,
+    'warning': WARNING,
+    'info': INFO,
+    'debug': DEBUG
+}
+
+level = _LEVELS[config['log_level']]
+
+
+def set_level(name: str) -> bool:
+    """Switches the log level by name ('error', 'warning', 'info' or 'debug'); returns False for unknown names."""
+    global level
+    if name not in _LEVELS:
+        return False
+    level = _LEVELS[name]
+    return True
+
+
+def enabled(message_level: int) -> bool:
+    """Whether messages at `message_level` are printed; check before building costly messages."""
+    return message_level <= level
+
+
+def error(message: str):
+    if level >= ERROR:
+        print(message)
+
+
+def warning(message: str):
+    if level >= WARNING:
+        print(message)
+
+
+def info(message: str):
+    if level >= INFO:
+        print(message)
+
+
+def debug(message: str):
+    if level >= DEBUG:
+        print(message)
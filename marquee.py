@@ -0,0 +1,87 @@
+import displayio
+
+from settings import settings
+from text_bitmap import TEXT_COLOR, TEXT_PALETTE, blit, new_bitmap, text_width
+from text_cache import text_cache
+
+
+class TextField:
+    """
+    A fixed-width field of text drawn in one of the TEXT_COLORS.
+
+    Text bitmaps come from the shared text cache and are blitted into the
+    field's own viewport bitmap, so showing a value seen before never lays
+    the text out again.
+    """
+    def __init__(self, x: int, y: int, width: int, text: str = '', color_index: int = TEXT_COLOR):
+        self.width = width
+        self.height = settings.character_height
+
+        self.viewport = new_bitmap(width)
+        self.tile_grid = displayio.TileGrid(self.viewport, pixel_shader=TEXT_PALETTE, x=x, y=y)
+
+        self._source = None
+        self._source_width = 0
+        self._offset = 0
+        self.set_text(text, color_index)
+
+    def set_text(self, text: str, color_index: int = TEXT_COLOR):
+        """Shows `text` in the color at `color_index` of TEXT_PALETTE."""
+        self._show(text_cache.get(text, color_index))
+
+    def _show(self, source):
+        self._source = source
+        self._source_width = source.width
+        self._offset = 0
+        self.viewport.fill(0)
+        self._draw()
+
+    def _draw(self):
+        blit(self.viewport, self._source, 0, 0, 0, 0, min(self.width, self._source_width), self.height)
+
+
+class Marquee(TextField):
+    """
+    A text field that scrolls text too long to fit.
+
+    The full text, followed by a gap, is rendered once into a cached bitmap.
+    Each scroll step then only blits the visible window of that bitmap into
+    the viewport, so stepping never lays text out again and never allocates.
+    """
+    def __init__(self, x: int, y: int, width: int, text: str = '', color_index: int = TEXT_COLOR):
+        # Whether the text is wider than the field.
+        self.scrolling = False
+        super().__init__(x, y, width, text, color_index)
+
+    def set_text(self, text: str, color_index: int = TEXT_COLOR):
+        """Shows `text` from the start, scrolling it if it does not fit."""
+        scrolling = settings.scroll_destinations and text_width(text) > self.width
+        if not scrolling:
+            text = text[:settings.destination_max_characters]
+        self.scrolling = scrolling
+        self._show(text_cache.get(text, color_index, settings.scroll_gap if scrolling else 0))
+
+    def scroll(self) -> int:
+        """
+        Moves scrolling text one pixel to the left, wrapping around after the gap.
+        Returns the number of display writes made (0 or 1).
+        """
+        if not self.scrolling:
+            return 0
+        self._offset += 1
+        if self._offset == self._source_width:
+            self._offset = 0
+        self._draw()
+        return 1
+
+    def _draw(self):
+        if not self.scrolling:
+            super()._draw()
+            return
+        # The window can run past the end of the text and gap, in which case
+        # the start of the text follows it.
+        offset = self._offset
+        first = min(self.width, self._source_width - offset)
+        blit(self.viewport, self._source, 0, 0, offset, 0, offset + first, self.height)
+        if first < self.width:
+            blit(self.viewport, self._source, first, 0, 0, 0, self.width - first, self.height)
@@ -1,31 +1,35 @@
-import board # type: ignore
-from adafruit_matrixportal.network import Network # type: ignore
+import adafruit_json_stream as json_stream # type: ignore
 
+import log
 from config import config
+from line_colors import DEFAULT_LINE_COLOR, LINE_COLORS
+from prediction import Prediction
+from ranking import arrival_key, top_n
+from quota import quota
+from receive_buffer import receive_buffer
+from resilience import CircuitBreaker, backoff_delay, run_async, run_blocking
+from response_cache import response_cache
+from schedule import schedule
+from settings import settings
+from stats import stats
+from transport import get_transport
 from secrets import secrets # type: ignore
 
-# Keeping a global reference for this
-_network = Network(status_neopixel=board.NEOPIXEL)
-
 class MetroApiOnFireException(Exception):
     """Custom exception for when the Metro API is consistently unreachable."""
     pass
 
+# Stops calling the API during outages instead of hammering it.
+_breaker = CircuitBreaker('Metro API', config['circuit_failure_threshold'], config['circuit_reset_timeout'])
+
 class MetroApi:
     """
     A class to interact with the Metro Transit API for train predictions.
     """
 
-    # Class-level dictionary for line colors, making it easy to extend and read.
-    _LINE_COLORS = {
-        'RD': 0xFF0000,  # Red
-        'OR': 0xFF5500,  # Orange
-        'YL': 0xFFFF00,  # Yellow
-        'GR': 0x00FF00,  # Green
-        'BL': 0x0000FF,  # Blue
-        'SV': 0xC0C0C0,  # Silver (commonly used, added for completeness)
-    }
-    _DEFAULT_COLOR = 0xAAAAAA # Default color for unknown lines
+    # Line colors are shared with the board's line indicator palette (line_palette.py).
+    _LINE_COLORS = LINE_COLORS
+    _DEFAULT_COLOR = DEFAULT_LINE_COLOR
 
     # A set for quick lookup of destination strings that need normalization.
     _DESTINATION_NORMALIZATIONS = {
@@ -34,12 +38,45 @@ class MetroApi:
         'ssenger'
     }
 
+    # The only StationPrediction fields read by _normalize_train_response.
+    _TRAIN_FIELDS = {
+        'Line',
+        'Destination',
+        'Min',
+        'Car',
+        'LocationCode'
+    }
+
     @staticmethod
-    def fetch_train_predictions(station_code: str, group: str) -> list[dict]:
+    def fetch_train_predictions(station_code, group: str) -> list[Prediction]:
         """
         Fetches train predictions for a given station and group.
-        Includes retry logic for API connection issues to improve resilience.
+        `station_code` may also be a list (or comma-separated string) of station
+        codes; all of them are fetched in a single request and merged by arrival.
+        Only the first num_trains trains by arrival are normalized and returned.
+        Includes retry logic with backoff for API connection issues, and a circuit
+        breaker that fails fast while the API is down.
+        Results are cached; an unchanged response returns the previous list object.
+        Sleeps through quota and backoff waits; the sign uses fetch_train_predictions_async.
+        """
+        return run_blocking(MetroApi._fetch_train_predictions(station_code, group))
+
+    @staticmethod
+    async def fetch_train_predictions_async(station_code, group: str) -> list[Prediction]:
+        """Like fetch_train_predictions, but awaits the quota and backoff waits so the sign's other tasks keep running."""
+        return await run_async(MetroApi._fetch_train_predictions(station_code, group))
+
+    @staticmethod
+    def _fetch_train_predictions(station_code, group: str):
         """
+        Does the work of fetch_train_predictions as a generator that yields the
+        seconds to wait (for the API quota or before a retry) and returns the
+        predictions.
+        """
+        # GetPrediction accepts comma-separated station codes.
+        if not isinstance(station_code, str):
+            station_code = ','.join(station_code)
+
         retry_attempt = 0
         # Loop to handle retries instead of recursion, preventing potential stack overflow.
         while retry_attempt <= config['metro_api_retries']:
@@ -48,34 +85,151 @@ class MetroApi:
                 api_url = f"{config['metro_api_url']}{station_code}"
                 headers = {'api_key': config['metro_api_key']}
 
-                # Fetch data from the network and parse as JSON.
-                train_data = _network.fetch(api_url, headers=headers).json()
-
-                print(f'Received response from WMATA api: {train_data}')
-
-                # Use a list comprehension for efficient filtering and mapping.
-                # .get() is used to safely access dictionary keys, providing a default empty list
-                # if 'Trains' key is missing, preventing KeyError.
-                normalized_results = [
-                    MetroApi._normalize_train_response(train)
-                    for train in train_data.get('Trains', [])
-                    if group == '*' or train.get('Group') == group # Safely check 'Group' key, and pass all if group is "*"
-                ]
-                
-                #Todo: sort the results so that yellow line trains work normally when the yellow line change destination is enabled.
-                #Sort by arrival time, treating 'BRD' as the highest priority
-
-                return normalized_results
-            except RuntimeError as e:
-                # Catch specific network-related errors.
-                print(f'Failed to connect to WMATA API. Error: {e}. Reattempting...')
+                # Serve straight from the cache while the last result is fresh.
+                cache_key = (api_url, group)
+                cached = response_cache.lookup(cache_key)
+                if cached is not None:
+                    return cached
+
+                if not _breaker.allow():
+                    raise MetroApiOnFireException("Metro API circuit is open; not fetching train predictions.")
+                if quota.exhausted():
+                    raise MetroApiOnFireException("Daily WMATA quota used up; not fetching train predictions.")
+
+                # Wait out the per-second budget here, where the sign can await it,
+                # rather than inside the request.
+                wait = quota.wait_time()
+                while wait > 0:
+                    yield wait
+                    wait = quota.wait_time()
+
+                start = stats.now()
+                response = get_transport().get(api_url, headers=response_cache.request_headers(cache_key, headers))
+                stats.record('fetch', start)
+                if response.status_code not in (200, 304):
+                    # Error bodies (rate limiting, a bad key, outages) hold no predictions.
+                    response.close()
+                    raise RuntimeError(f'HTTP status {response.status_code}')
+
+                # Stream the response body, filtering trains as they are parsed and
+                # ranking them as they arrive, so only the first num_trains are ever held.
+                # WMATA's order cannot be relied on: the Mt Vernon Square rewrite turns
+                # '---' into 'BRD', and several stations come back one after another.
+                start = stats.now()
+                try:
+                    trains = [] if response.status_code == 304 else top_n(MetroApi._decode_trains(response, group), settings.num_trains, MetroApi._train_key)
+                finally:
+                    response.close()
+                stats.record('decode', start)
+
+                # The body is never held in full, so the digest covers the trains shown.
+                digest = None if response.status_code == 304 else hash(tuple(tuple(train.values()) for train in trains))
+                cached = response_cache.revalidate(cache_key, response, digest)
+                if cached is not None:
+                    _breaker.success()
+                    log.debug('WMATA train predictions unchanged.')
+                    return cached
+
+                if log.enabled(log.DEBUG):
+                    log.debug(f'Received {len(trains)} trains to show from WMATA api.')
+
+                # Only the trains shown get normalized.
+                start = stats.now()
+                normalized_results = [MetroApi._normalize_train_response(train) for train in trains]
+                stats.record('normalize', start)
+
+                _breaker.success()
+                return response_cache.store(cache_key, response, digest, normalized_results)
+            except (RuntimeError, OSError, ValueError, EOFError) as e:
+                # Catch network-related errors and truncated or garbled responses.
+                log.warning(f'Failed to connect to WMATA API. Error: {e}. Reattempting...')
+                # A half-open circuit allows a single probe, not a round of retries.
+                if _breaker.state == CircuitBreaker.HALF_OPEN:
+                    break
+                if retry_attempt < config['metro_api_retries']:
+                    yield backoff_delay(retry_attempt)
                 retry_attempt += 1
         
         # If all retries fail, raise a custom exception with a descriptive message.
+        _breaker.failure()
         raise MetroApiOnFireException("Failed to fetch train predictions after multiple retries.")
 
     @staticmethod
-    def _normalize_train_response(train: dict) -> dict:
+    def fetch_scheduled_departures(station_code, group: str) -> list[Prediction]:
+        """
+        Returns the next num_trains departures of `group` at the station (or
+        stations) from the timetable, for when WMATA is unreachable. They are
+        normalized like live predictions, with `scheduled` set.
+        Returns None if there is no timetable or the time of day is not known yet.
+        """
+        station_codes = station_code.split(',') if isinstance(station_code, str) else station_code
+        # Groups are tracks; the timetable knows the GTFS direction of each trip.
+        direction = None if group == '*' else config['schedule_train_directions'].get(group)
+        departures = schedule.departures(station_codes, direction, settings.num_trains)
+        if departures is None:
+            return None
+        return [
+            Prediction(MetroApi._get_line_color(line, destination), destination, str(minutes) if minutes else 'ARR', '-', True)
+            for minutes, line, destination in departures
+        ]
+
+    @staticmethod
+    def _decode_trains(response, group: str):
+        """
+        Incrementally decodes a StationPrediction response body, read through
+        the shared receive buffer, yielding each train as soon as it is read.
+        Trains outside `group` are dropped as soon as their 'Group' is read, and
+        only the fields in _TRAIN_FIELDS are kept.
+        """
+        data = json_stream.load(receive_buffer.chunks(response))
+        # An empty or unexpectedly shaped body is a failed fetch, not an empty list.
+        if not isinstance(data, json_stream.TransientObject):
+            raise ValueError('response is not a JSON object')
+        try:
+            raw_trains = data['Trains']
+        except KeyError:
+            return
+        if not isinstance(raw_trains, json_stream.TransientList):
+            raise ValueError("'Trains' is not a list")
+
+        for raw_train in raw_trains:
+            if not isinstance(raw_train, json_stream.TransientObject):
+                raise ValueError("'Trains' holds something other than objects")
+            # Pass all trains if group is "*", otherwise wait for the 'Group' key.
+            matched = group == '*'
+            train = {}
+            for key, value in raw_train.items():
+                if key == 'Group':
+                    if not matched and value != group:
+                        break
+                    matched = True
+                elif key in MetroApi._TRAIN_FIELDS:
+                    train[key] = value
+
+            if matched:
+                yield train
+
+    @staticmethod
+    def _train_key(train: dict) -> int:
+        """Sort key for a raw train, ranking Mt Vernon Square yellow line trains as boarding when they will be shown that way."""
+        return arrival_key(MetroApi._get_arrival(train))
+
+    @staticmethod
+    def _get_arrival(train: dict) -> str:
+        """
+        Returns the arrival time that will be displayed for a raw train.
+        Yellow line trains at Mount Vernon Square show '---' but are boarding.
+        """
+        arrival = train.get('Min', '')
+        if (arrival == '---' and
+                settings.yellow_line_destination is not None and
+                train.get('LocationCode', '') == 'E01' and  # E01 is Mount Vernon Square
+                train.get('Destination', '') in MetroApi._DESTINATION_NORMALIZATIONS):
+            return 'BRD'
+        return arrival
+
+    @staticmethod
+    def _normalize_train_response(train: dict) -> Prediction:
         """
         Normalizes the raw train response from the API into a more consistent format.
         """
@@ -83,36 +237,36 @@ class MetroApi:
         # to prevent KeyError if keys are missing from the API response.
         line = train.get('Line', '')
         destination = train.get('Destination', '')
-        arrival = train.get('Min', '')
+        arrival = MetroApi._get_arrival(train)
         car = train.get('Car', '')
         locationCode = train.get('LocationCode', '')
 
         # Check if the destination needs normalization using the predefined set.
         if destination in MetroApi._DESTINATION_NORMALIZATIONS:
             destination = 'No Psngr'
-            if config['yellow_line_change_destination_MVSQ'] and locationCode == 'E01':  # E01 is Mount Vernon Square
-                destination = config['yellow_line_change_destination_text']
-                arrival = 'BRD' if arrival == '---' else arrival
+            if settings.yellow_line_destination is not None and locationCode == 'E01':  # E01 is Mount Vernon Square
+                destination = settings.yellow_line_destination
         
         
         if car == None:
             car = '-'
 
-        return {
-            'line_color': MetroApi._get_line_color(line, destination),
-            'destination': destination,
-            'arrival': arrival,
-            'car': car
-        }
+        return Prediction(
+            MetroApi._get_line_color(line, destination),
+            destination,
+            arrival,
+            car,
+            False
+        )
     
     @staticmethod
     def _get_line_color(line: str, destination: str) -> int:
         """
         Returns the hexadecimal color for a given Metro line code.
         Uses a dictionary lookup for efficiency and readability.
+        Destinations in settings.destination_lines (the Mt Vernon Square
+        yellow line rewrite) take the color of that line instead.
         """
-        if destination == config['yellow_line_change_destination_text']:
-            # If the destination is the special case, return yellow color.
-            return MetroApi._LINE_COLORS.get('YL', MetroApi._DEFAULT_COLOR)
+        line = settings.destination_lines.get(destination, line)
         # Use .get() with a default value to handle lines not explicitly defined.
         return MetroApi._LINE_COLORS.get(line, MetroApi._DEFAULT_COLOR)
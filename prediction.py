@@ -0,0 +1,13 @@
+from collections import namedtuple
+
+# A single normalized arrival prediction, shared by MetroApi, BusApi and the board.
+# A namedtuple is a fixed-size tuple with no per-instance attribute dictionary
+# (CPython gives it empty __slots__, and CircuitPython ignores __slots__ on
+# regular classes), so each record costs far less heap than a four-key dict.
+#
+#   line_color  - 0xRRGGBB color of the line indicator
+#   destination - destination text
+#   arrival     - minutes (str for trains, int for buses), 'ARR', 'BRD' or '---'
+#   car         - number of cars as a string, '-' when unknown or for buses
+#   scheduled   - True when taken from the timetable (schedule.py) instead of live predictions
+Prediction = namedtuple('Prediction', ('line_color', 'destination', 'arrival', 'car', 'scheduled'))
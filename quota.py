@@ -0,0 +1,136 @@
+import math
+import time
+
+import log
+from config import config
+
+# Seconds in a quota day.
+DAY = 86400
+
+
+class QuotaGovernor:
+    """
+    Keeps WMATA requests from MetroApi and BusApi within the API key's quota.
+
+    Per second, a token bucket holding at most `burst` tokens refills at
+    `per_second` tokens a second and every request takes one, so requests
+    for several stations or stops are spread out instead of bursting together.
+
+    Per day, requests are counted against `per_day`. The request rate is
+    tracked as a moving average, and interval_scale() stretches the poll
+    interval for as long as that rate would use up the rest of the day's
+    budget early, so polling slows down gradually instead of stopping at the
+    limit.
+    Signs have no real-time clock, so the quota day starts with the first
+    request and restarts every 24 hours after it.
+    """
+
+    # Seconds over which the request rate is averaged.
+    RATE_WINDOW = 900
+    # Most poll intervals are stretched by, even once the budget is used up.
+    MAX_SCALE = 30.0
+
+    def __init__(self, per_second: float, per_day: int, burst: int = 1):
+        self.per_second = per_second
+        self.per_day = per_day
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._refilled_at = None
+
+        self.day_started = None
+        self.used_today = 0
+        # Requests a second, as a moving average over RATE_WINDOW.
+        self.rate = 0.0
+        self._last_request = None
+        # Factor poll intervals are currently stretched by.
+        self._scale = 1.0
+
+    def wait_time(self) -> float:
+        """
+        Returns the seconds until the per-second budget allows a request, 0 if
+        it allows one now. MetroApi and BusApi wait this out before each
+        request (awaiting it on the sign), so acquire() never has to block.
+        """
+        tokens = self._tokens
+        if self._refilled_at is not None:
+            tokens = min(self.burst, tokens + (time.monotonic() - self._refilled_at) * self.per_second)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.per_second
+
+    def acquire(self):
+        """
+        Counts a request against the per-second and per-day budgets. If the
+        caller did not wait out wait_time() first, it sleeps until the
+        per-second budget allows the request, blocking everything else.
+        """
+        now = time.monotonic()
+        self._new_day(now)
+
+        if self._refilled_at is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.per_second)
+        self._refilled_at = now
+        if self._tokens < 1:
+            wait = (1 - self._tokens) / self.per_second
+            time.sleep(wait)
+            now += wait
+            self._tokens = 1.0
+            self._refilled_at = now
+        self._tokens -= 1
+
+        if self._last_request is not None:
+            elapsed = max(now - self._last_request, 1e-3)
+            weight = 1 - math.exp(-elapsed / QuotaGovernor.RATE_WINDOW)
+            self.rate += weight * (1 / elapsed - self.rate)
+            # Nudge the scale by how far the rate is off what the rest of the
+            # day can afford, at the same pace the rate average moves.
+            remaining = self.remaining_today()
+            if remaining:
+                wanted = self.rate * self.seconds_left_today()
+                scale = self._scale * (wanted / remaining) ** weight if wanted else 1.0
+                self._scale = min(max(scale, 1.0), QuotaGovernor.MAX_SCALE)
+        self._last_request = now
+        self.used_today += 1
+
+    def exhausted(self) -> bool:
+        """Whether the day's budget is used up; requests should not be made until it resets."""
+        self._new_day(time.monotonic())
+        return self.used_today >= self.per_day
+
+    def remaining_today(self) -> int:
+        return max(self.per_day - self.used_today, 0)
+
+    def seconds_left_today(self) -> float:
+        if self.day_started is None:
+            return DAY
+        return max(DAY - (time.monotonic() - self.day_started), 0.0)
+
+    def projected_today(self) -> int:
+        """Returns the requests the day will end with if the current rate continues."""
+        return int(self.used_today + self.rate * self.seconds_left_today())
+
+    def interval_scale(self) -> float:
+        """
+        Returns the factor to stretch poll intervals by (1 or more) so the
+        request rate fits the rest of the day's budget.
+        """
+        if self.exhausted():
+            return QuotaGovernor.MAX_SCALE
+        return self._scale
+
+    def dump(self):
+        """Prints the current budget and the projected usage for the day."""
+        print(
+            f'quota: {self.used_today}/{self.per_day} requests today, {self.remaining_today()} left, '
+            f'{self.projected_today()} projected by end of day, '
+            f'poll intervals x{self.interval_scale():.1f}, {self._tokens:.1f}/{self.burst} tokens'
+        )
+
+    def _new_day(self, now: float):
+        if self.day_started is None or now - self.day_started >= DAY:
+            if self.day_started is not None:
+                log.info(f'New quota day; {self.used_today} requests were made in the last one.')
+            self.day_started = now
+            self.used_today = 0
+
+
+quota = QuotaGovernor(config['quota_per_second'], config['quota_per_day'], config['quota_burst'])
@@ -0,0 +1,63 @@
+# Sort position for arrivals that are not a number of minutes ('---', blanks, ...).
+_NO_PREDICTION = 1000
+
+# Precomputed sort keys for every arrival value WMATA normally sends, so ranking
+# is a dictionary lookup instead of string comparisons and int() parsing.
+# Train minutes arrive as strings and bus minutes as integers; both are covered.
+_ARRIVAL_KEYS = {
+    'BRD': -2,
+    'ARR': -1,
+    '---': _NO_PREDICTION,
+    '': _NO_PREDICTION,
+    None: _NO_PREDICTION,
+}
+for _minutes in range(100):
+    _ARRIVAL_KEYS[str(_minutes)] = _minutes
+    _ARRIVAL_KEYS[_minutes] = _minutes
+
+
+def arrival_key(arrival) -> int:
+    """
+    Returns a numeric sort key for an arrival prediction:
+    'BRD' first, then 'ARR', then minutes ascending, then anything else.
+    """
+    key = _ARRIVAL_KEYS.get(arrival)
+    if key is not None:
+        return key
+    try:
+        return int(arrival)
+    except (TypeError, ValueError):
+        return _NO_PREDICTION
+
+
+def prediction_key(prediction) -> int:
+    """Sort key for a normalized Prediction."""
+    return arrival_key(prediction.arrival)
+
+
+def top_n(items, n: int, key=prediction_key) -> list:
+    """
+    Returns the `n` items with the lowest key, in order, without sorting the rest.
+    Each key is computed once. Items with equal keys keep their original order.
+    """
+    if n <= 0:
+        return []
+
+    best_keys = []
+    best = []
+    for item in items:
+        item_key = key(item)
+        if len(best) == n and item_key >= best_keys[-1]:
+            continue
+
+        # Insert after any equal keys so ties stay in their original order.
+        i = len(best_keys)
+        while i > 0 and best_keys[i - 1] > item_key:
+            i -= 1
+        best_keys.insert(i, item_key)
+        best.insert(i, item)
+
+        if len(best) > n:
+            best_keys.pop()
+            best.pop()
+    return best
@@ -0,0 +1,55 @@
+from config import config
+
+
+class ReceiveBuffer:
+    """
+    One preallocated buffer that every response body is read into.
+
+    Reading a body with response.content or iter_content() allocates a new
+    bytes object for the body or for every chunk of it. Over hours of fetches
+    those short-lived blocks of varying sizes fragment the heap until a
+    large enough block can no longer be found. Instead, chunks() reads each
+    chunk into the same bytearray and yields memoryviews of it, which
+    adafruit_json_stream decodes without copying.
+    """
+    def __init__(self, size: int):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+
+        # Bodies read and the largest one seen, in bytes.
+        self.bodies = 0
+        self.largest_body = 0
+
+    def chunks(self, response):
+        """
+        Yields the body of `response` as memoryviews of the buffer.
+        Each chunk is only valid until the next one is read, so it must be
+        consumed (not kept) before asking for the next.
+        """
+        self.bodies += 1
+        total = 0
+        while True:
+            size = response.readinto(self._buffer)
+            if not size:
+                break
+            total += size
+            # Decoding stops reading once it has what it needs, so the
+            # generator is rarely exhausted; count as the body is read.
+            if total > self.largest_body:
+                self.largest_body = total
+            yield self._view if size == len(self._buffer) else self._view[:size]
+
+    def drain(self, response) -> int:
+        """
+        Reads the rest of the body of `response` into the buffer, discarding it,
+        so the connection can be reused. Returns the bytes discarded.
+        """
+        drained = 0
+        while True:
+            size = response.readinto(self._buffer)
+            if not size:
+                return drained
+            drained += size
+
+
+receive_buffer = ReceiveBuffer(config['receive_buffer_size'])
@@ -0,0 +1,82 @@
+import asyncio
+import random
+import time
+
+import log
+from config import config
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Returns how long to wait before retry number `attempt` (starting at 0):
+    exponential backoff capped at backoff_max, with full jitter so that signs
+    recovering from the same outage do not retry in lockstep.
+    """
+    return random.uniform(0, min(config['backoff_max'], config['backoff_base'] * (2 ** attempt)))
+
+
+def run_blocking(steps):
+    """
+    Runs a fetch written as a generator that yields the seconds to wait (for
+    the API quota or before a retry) and returns its result, sleeping through
+    the waits. For hosts
+    that have nothing else to do meanwhile, such as the aggregator.
+    """
+    try:
+        while True:
+            time.sleep(next(steps))
+    except StopIteration as e:
+        return e.value
+
+
+async def run_async(steps):
+    """Like run_blocking(), but awaits the waits so the sign's other tasks keep running."""
+    try:
+        while True:
+            await asyncio.sleep(next(steps))
+    except StopIteration as e:
+        return e.value
+
+
+class CircuitBreaker:
+    """
+    Stops calling an API after repeated failures.
+
+    CLOSED:    requests are allowed; `failure_threshold` failed fetches in a row open the circuit.
+    OPEN:      requests are refused until `reset_timeout` seconds have passed.
+    HALF_OPEN: one probe request is allowed; success closes the circuit, failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        """Returns whether a request may be made now."""
+        if self.state == CircuitBreaker.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = CircuitBreaker.HALF_OPEN
+            log.info(f'{self.name} circuit half-open, probing.')
+        return True
+
+    def success(self):
+        if self.state != CircuitBreaker.CLOSED:
+            log.info(f'{self.name} circuit closed.')
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != CircuitBreaker.OPEN:
+                log.warning(f'{self.name} circuit open for {self.reset_timeout} s after {self.failures} failures.')
+            self.state = CircuitBreaker.OPEN
+            self._opened_at = time.monotonic()
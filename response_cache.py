@@ -0,0 +1,120 @@
+import time
+
+from config import config
+
+
+class ResponseCache:
+    """
+    Caches normalized API results keyed by endpoint and station/stop.
+
+    A result younger than `ttl` seconds is served without touching the network.
+    Older results are revalidated: the ETag/Last-Modified validators from the
+    previous response are sent as conditional headers, and a 304 reply or a
+    body with the same digest as last time returns the cached result object
+    itself, so callers can skip parsing, normalization and rendering.
+    """
+
+    # Entry layout: [fetched_at, etag, last_modified, digest, result]
+    _FETCHED_AT = 0
+    _ETAG = 1
+    _LAST_MODIFIED = 2
+    _DIGEST = 3
+    _RESULT = 4
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+
+        # Results served from the cache without making a request.
+        self.hits = 0
+        # Requests whose body was parsed and normalized into a new result.
+        self.misses = 0
+        # Requests that showed nothing changed, so the old result was reused.
+        self.skips = 0
+
+    def lookup(self, key):
+        """Returns the cached result for `key` if it is still within the TTL, otherwise None."""
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[ResponseCache._FETCHED_AT] < self.ttl:
+            self.hits += 1
+            return entry[ResponseCache._RESULT]
+        return None
+
+    def request_headers(self, key, headers: dict) -> dict:
+        """Adds conditional request headers for `key` when the last response provided validators."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[ResponseCache._ETAG]:
+                headers['If-None-Match'] = entry[ResponseCache._ETAG]
+            if entry[ResponseCache._LAST_MODIFIED]:
+                headers['If-Modified-Since'] = entry[ResponseCache._LAST_MODIFIED]
+        return headers
+
+    def revalidate(self, key, response, digest=None):
+        """
+        Returns the cached result for `key` if `response` was a 304 or its digest
+        matches the cached one, otherwise None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if response.status_code == 304 or (digest is not None and digest == entry[ResponseCache._DIGEST]):
+            entry[ResponseCache._FETCHED_AT] = time.monotonic()
+            self.skips += 1
+            return entry[ResponseCache._RESULT]
+        return None
+
+    def store(self, key, response, digest, result):
+        """Caches a freshly built `result` for `key` along with the response validators."""
+        self.misses += 1
+        self._entries[key] = [
+            time.monotonic(),
+            _get_header(response.headers, 'etag'),
+            _get_header(response.headers, 'last-modified'),
+            digest,
+            result
+        ]
+        return result
+
+    def confirmed_at(self, result):
+        """
+        Returns the monotonic time WMATA last confirmed `result` (it was built,
+        or a later response showed it unchanged), or None if it is not cached.
+        A result served within the TTL was not confirmed again.
+        """
+        for entry in self._entries.values():
+            if entry[ResponseCache._RESULT] is result:
+                return entry[ResponseCache._FETCHED_AT]
+        return None
+
+    def clear(self):
+        """Drops every cached result."""
+        self._entries.clear()
+
+    def counters(self) -> dict:
+        """Returns the hit/miss/skip counters."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'skips': self.skips
+        }
+
+    def dump(self):
+        """Prints how many requests and how much parsing the cache saved."""
+        print(
+            f'response cache: {len(self._entries)} entries, {self.hits} hits without a request, '
+            f'{self.skips} unchanged responses reused, {self.misses} results built'
+        )
+
+
+def _get_header(headers: dict, name: str):
+    """Case-insensitive lookup of a response header, returning None when absent."""
+    for header, value in headers.items():
+        if header.lower() == name:
+            return value
+    return None
+
+
+# Shared by MetroApi and BusApi; keys include the endpoint so they never collide.
+response_cache = ResponseCache(config['response_cache_ttl'])
@@ -0,0 +1,201 @@
+import struct
+
+import clock
+import log
+from config import config
+
+# Timetable index built from a GTFS static feed by build_schedule.py, used
+# when WMATA is unreachable. All integers are big-endian.
+#
+# The file starts with a header:
+#     magic       4s  b'MSTT'
+#     version     B   VERSION
+#     patterns    B   service patterns, i.e. distinct sets of GTFS services running on a day
+#     first_day   H   first service day covered, in days since 1970-01-01
+#     days        H   number of service days covered
+#     stops       H   number of stops
+#     strings     H   number of strings
+#     departures  I   number of departures
+#
+# followed by
+#     `days` bytes, the pattern running on each day (NO_SERVICE for none),
+#     `stops` stop entries sorted by key, each made of
+#         key   12s  station code or stop code, NUL padded
+#         and for each pattern a run: the index of its first departure (I)
+#         and the number of its departures (H),
+#     `departures` departures, sorted by minute within each run, each made of
+#         minute     H  minutes after midnight of the service day (24:00 and
+#                       later for trips running past midnight)
+#         direction  B  GTFS direction_id
+#         route      H  string index of the route (the line code for Metrorail)
+#         headsign   H  string index of the headsign
+#     `strings` + 1 offsets (I) into the string data, and the UTF-8 string data.
+#
+# Every section has a fixed size, so a departure is found by seeking to it;
+# stops and departures are binary searched without reading the file into memory.
+
+MAGIC = b'MSTT'
+VERSION = 1
+NO_SERVICE = 255
+MAX_PATTERNS = NO_SERVICE
+
+HEADER = struct.Struct('>4sBBHHHHI')
+KEY_SIZE = 12
+RUN = struct.Struct('>IH')
+DEPARTURE = struct.Struct('>HBHH')
+OFFSET = struct.Struct('>I')
+
+_MINUTES_PER_DAY = 1440
+
+
+class Schedule:
+    """
+    Looks up upcoming departures in a timetable index file.
+
+    The file is opened on first use and kept open. Every read goes into one
+    small preallocated buffer, so a lookup takes the same memory however
+    large the index is; only the strings of the departures returned are
+    allocated.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._failed = False
+
+        self._buffer = bytearray(max(HEADER.size, KEY_SIZE, RUN.size, DEPARTURE.size, 2 * OFFSET.size))
+        self._view = memoryview(self._buffer)
+
+    def departures(self, keys: list, direction: int, limit: int) -> list:
+        """
+        Returns up to `limit` (minutes from now, route, headsign) tuples for
+        the next departures from any of the stops in `keys`, ordered by
+        departure, within config['schedule_horizon_minutes']. `direction` is
+        a GTFS direction_id, or None for every direction.
+        Returns None if there is no index, it does not cover today or the
+        time of day is not known yet.
+        """
+        now = clock.local_day_and_minute()
+        if now is None or not self._open():
+            return None
+        day, minute = now
+        if not 0 <= day - self._first_day < self._days:
+            log.warning(f'The timetable {self.path} does not cover today; rebuild it with build_schedule.py.')
+            return None
+        horizon = config['schedule_horizon_minutes']
+
+        try:
+            found = []
+            for key in keys:
+                stop = self._find_stop(key)
+                if stop is None:
+                    continue
+                # Trips running past midnight belong to the previous service day.
+                for service_day, since in ((day, minute), (day - 1, minute + _MINUTES_PER_DAY)):
+                    pattern = self._pattern(service_day)
+                    if pattern is not None:
+                        self._collect(found, stop, pattern, since, direction, horizon, limit)
+
+            found.sort(key=lambda departure: departure[0])
+            return [(minutes, self._string(route), self._string(headsign)) for minutes, route, headsign in found[:limit]]
+        except (OSError, ValueError) as e:
+            log.warning(f'Failed to read the timetable {self.path}. Error: {e}')
+            self.close()
+            return None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+
+    def _open(self) -> bool:
+        if self._file is not None:
+            return True
+        if self._failed or not self.path:
+            return False
+        try:
+            self._file = open(self.path, 'rb')
+            header = HEADER.unpack_from(self._read(0, HEADER.size))
+            if header[0] != MAGIC or header[1] != VERSION:
+                raise ValueError('not a timetable of this version')
+        except (OSError, ValueError) as e:
+            log.warning(f'No timetable to fall back on: {self.path}. Error: {e}')
+            # Only try once; a missing index stays missing until the next boot.
+            self._failed = True
+            self.close()
+            return False
+
+        _, _, patterns, first_day, days, stops, strings, departures = header
+        self._first_day = first_day
+        self._days = days
+        self._stops = stops
+        self._stop_size = KEY_SIZE + patterns * RUN.size
+        self._days_at = HEADER.size
+        self._stops_at = self._days_at + days
+        self._departures_at = self._stops_at + stops * self._stop_size
+        self._offsets_at = self._departures_at + departures * DEPARTURE.size
+        self._strings_at = self._offsets_at + (strings + 1) * OFFSET.size
+        return True
+
+    def _read(self, offset: int, size: int):
+        self._file.seek(offset)
+        view = self._view[:size]
+        if self._file.readinto(view) != size:
+            raise ValueError('truncated timetable')
+        return view
+
+    def _pattern(self, day: int) -> int:
+        """Returns the service pattern running on `day`, or None if there is none or the day is not covered."""
+        if not 0 <= day - self._first_day < self._days:
+            return None
+        pattern = self._read(self._days_at + day - self._first_day, 1)[0]
+        return None if pattern == NO_SERVICE else pattern
+
+    def _find_stop(self, key: str) -> int:
+        """Returns the index of the stop entry for `key`, or None if the index has no such stop."""
+        key = key.encode('utf-8')[:KEY_SIZE]
+        key += bytes(KEY_SIZE - len(key))
+        low = 0
+        high = self._stops
+        while low < high:
+            middle = (low + high) // 2
+            entry = bytes(self._read(self._stops_at + middle * self._stop_size, KEY_SIZE))
+            if entry < key:
+                low = middle + 1
+            elif entry > key:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def _collect(self, found: list, stop: int, pattern: int, since: int, direction: int, horizon: int, limit: int):
+        """Appends the departures of one run from minute `since` on, up to `limit` of them, to `found`."""
+        first, count = RUN.unpack_from(self._read(self._stops_at + stop * self._stop_size + KEY_SIZE + pattern * RUN.size, RUN.size))
+
+        # The first departure at or after `since`.
+        low = first
+        high = first + count
+        while low < high:
+            middle = (low + high) // 2
+            if DEPARTURE.unpack_from(self._read(self._departures_at + middle * DEPARTURE.size, DEPARTURE.size))[0] < since:
+                low = middle + 1
+            else:
+                high = middle
+
+        taken = 0
+        for index in range(low, first + count):
+            minute, departure_direction, route, headsign = DEPARTURE.unpack_from(
+                self._read(self._departures_at + index * DEPARTURE.size, DEPARTURE.size)
+            )
+            if minute - since > horizon or taken >= limit:
+                break
+            if direction is None or departure_direction == direction:
+                found.append((minute - since, route, headsign))
+                taken += 1
+
+    def _string(self, index: int) -> str:
+        start, end = struct.unpack_from('>II', self._read(self._offsets_at + index * OFFSET.size, 2 * OFFSET.size))
+        self._file.seek(self._strings_at + start)
+        return self._file.read(end - start).decode('utf-8')
+
+
+schedule = Schedule(config['schedule_path'])
@@ -0,0 +1,223 @@
+import asyncio
+import gc
+import time
+
+import log
+from config import config
+from countdown import poll_interval
+from quota import quota
+from response_cache import response_cache
+from stats import stats
+from text_cache import text_cache
+from transport import dump_transport
+
+BUTTON_POLL_INTERVAL = config['button_poll_interval']
+RENDER_INTERVAL = config['render_interval']
+STATS_HOLD_SECONDS = config['stats_hold_seconds']
+SCROLL_INTERVAL = 1 / config['scroll_fps']
+STALE_MAX_AGE = config['stale_max_age']
+AGGREGATOR_POLL_INTERVAL = config['aggregator_poll_interval']
+
+
+class SignState:
+    """
+    State shared between the scheduler tasks, and the boards and data sources
+    they work on, one entry per board:
+        names      - board names, for logging
+        boards     - DisplayBoards, built once and swapped with show()
+        fetchers   - coroutine functions returning the board's latest predictions,
+                     or None when they are unavailable
+        timetables - return scheduled departures when live predictions have been
+                     unavailable for longer than STALE_MAX_AGE, or None
+        feeds      - the AggregatorClient a fetcher polls, or None when it fetches from WMATA
+    Each board keeps its own latest data so switching never waits on a fetch
+    for data that is already known.
+    """
+    def __init__(self, names: list, boards: list, fetchers: list, timetables: list, feeds: list):
+        self.names = names
+        self.boards = boards
+        self.fetchers = fetchers
+        self.timetables = timetables
+        self.feeds = feeds
+
+        self.current_board = 0
+        self.data = [None] * len(boards)
+        # Monotonic time each board's data was last confirmed by its source, used
+        # to count minutes down locally and to age it against STALE_MAX_AGE.
+        self.fetched_at = [0.0] * len(boards)
+        # Whether each board is showing its last good data because the API is failing.
+        self.stale = [False] * len(boards)
+        # Whether each board is showing departures from the timetable instead.
+        self.scheduled = [False] * len(boards)
+        # Set when a board becomes current so its fetch task runs immediately.
+        self.wake = [asyncio.Event() for _ in boards]
+        # Monotonic time of the last button release, until the switched-to board has been rendered.
+        self.switched_at = None
+        # Most recent press-to-first-render latency of a board switch, in seconds.
+        self.switch_latency = None
+        # Whether real predictions have been drawn since boot.
+        self.first_prediction_shown = False
+
+
+def board_switch(state: SignState):
+    """
+    Switches the current board being displayed.
+    Cycles through the boards in `state.boards`.
+    """
+    state.current_board = (state.current_board + 1) % len(state.boards)
+    state.boards[state.current_board].show()
+    state.wake[state.current_board].set()
+    log.info(f'Switched to {state.names[state.current_board]} board.')
+
+
+def dump_stats():
+    """
+    Prints the timing stats, the requests made and the connections they
+    opened, the text cache's hit rate and memory use, the work the response
+    cache saved and the API quota budget.
+    """
+    stats.dump()
+    dump_transport()
+    text_cache.dump()
+    response_cache.dump()
+    quota.dump()
+
+
+async def button_task(state: SignState, button):
+    """
+    Polls and debounces the board switch button (an adafruit_debouncer Debouncer).
+    A short press switches boards when released; holding it for
+    STATS_HOLD_SECONDS dumps timing stats instead.
+    """
+    pressed_at = None
+    held = False
+    while True:
+        button.update()
+        now = time.monotonic()
+        if button.fell:
+            pressed_at = now
+            held = False
+        elif button.rose and pressed_at is not None:
+            if not held:
+                state.switched_at = now
+                board_switch(state)
+            pressed_at = None
+        elif pressed_at is not None and not held and now - pressed_at >= STATS_HOLD_SECONDS:
+            held = True
+            dump_stats()
+        await asyncio.sleep(BUTTON_POLL_INTERVAL)
+
+
+async def fetch_task(state: SignState, index: int):
+    """
+    Fetches data for one board while it is the current board, waiting between
+    fetches for as long as poll_interval() says the predictions allow.
+    A single request still blocks while it runs; input and rendering are
+    serviced between requests, and while a fetch waits for the API quota or
+    its retry backoff, instead of being starved by a sleeping loop.
+    Garbage is collected before every fetch, and the free heap sampled then.
+    """
+    wake = state.wake[index]
+    feed = state.feeds[index]
+    while True:
+        if state.current_board == index:
+            # Collect here, after the last render and before the fetch allocates,
+            # rather than whenever an allocation happens to run out of heap.
+            gc.collect()
+            stats.sample_memory()
+            data = await state.fetchers[index]()
+            now = time.monotonic()
+            if data is None and feed is not None and feed.waiting():
+                # Keep the loading screen up until the aggregator's first frame arrives.
+                pass
+            elif data is not None:
+                # An unchanged result is the same list object, so the render
+                # task skips it; it still counts down from its last confirmation.
+                state.data[index] = data
+                state.fetched_at[index] = _confirmed_at(data, feed, now)
+                state.stale[index] = False
+                state.scheduled[index] = False
+            elif state.data[index] is not None and not state.scheduled[index] and now - state.fetched_at[index] < STALE_MAX_AGE:
+                # Keep serving the last good predictions, still counting down, until they are too old.
+                state.stale[index] = True
+            else:
+                # Then fall back on the timetable, or show nothing without one.
+                state.data[index] = state.timetables[index]()
+                state.fetched_at[index] = now
+                state.stale[index] = False
+                state.scheduled[index] = state.data[index] is not None
+        try:
+            await asyncio.wait_for(wake.wait(), AGGREGATOR_POLL_INTERVAL if feed is not None else poll_interval(state.data[index]))
+        except asyncio.TimeoutError:
+            pass
+        wake.clear()
+
+
+def _confirmed_at(data: list, feed, now: float) -> float:
+    """
+    Returns when `data` was last confirmed: a 304, an unchanged body or an
+    aggregator keyframe confirms it again without changing it. A result
+    served from the response cache within its TTL keeps its older time.
+    """
+    confirmed = feed.confirmed_at() if feed is not None else response_cache.confirmed_at(data)
+    return now if confirmed is None else confirmed
+
+
+async def render_task(state: SignState, on_first_prediction=None):
+    """
+    Renders the current board whenever it or its data changes, and once a
+    minute in between so arrival times count down without a fetch.
+    Calls `on_first_prediction` once, when real predictions are first drawn,
+    and records the press-to-first-render latency of board switches.
+    """
+    rendered_board = None
+    rendered_data = None
+    rendered_age = 0
+    rendered_stale = False
+    while True:
+        index = state.current_board
+        data = state.data[index]
+        stale = state.stale[index]
+        age = time.monotonic() - state.fetched_at[index]
+        # Keep the loading screen up until the board's first fetch has finished.
+        if state.fetched_at[index] and (index != rendered_board or data is not rendered_data or int(age // 60) != rendered_age or stale != rendered_stale):
+            state.boards[index].render(data, age, stale)
+            rendered_board = index
+            rendered_data = data
+            rendered_age = int(age // 60)
+            rendered_stale = stale
+
+            if data is not None and not state.first_prediction_shown:
+                state.first_prediction_shown = True
+                if on_first_prediction is not None:
+                    on_first_prediction()
+
+        if state.switched_at is not None:
+            # The switched-to board is up to date on the display now.
+            state.switch_latency = time.monotonic() - state.switched_at
+            state.switched_at = None
+            log.info(f'Board switch took {state.switch_latency * 1000:.0f} ms.')
+        await asyncio.sleep(RENDER_INTERVAL)
+
+
+async def scroll_task(state: SignState):
+    """
+    Scrolls long destinations on the current board by one pixel per frame.
+    Each frame only blits into bitmaps that already exist, so frames never allocate.
+    """
+    while True:
+        state.boards[state.current_board].scroll()
+        await asyncio.sleep(SCROLL_INTERVAL)
+
+
+def tasks(state: SignState, button, on_first_prediction=None) -> list:
+    """
+    Returns the sign's cooperative tasks, to be gathered by the event loop:
+    button input, rendering, scrolling and a fetch task per board.
+    """
+    return [
+        button_task(state, button),
+        render_task(state, on_first_prediction),
+        scroll_task(state),
+        *[fetch_task(state, i) for i in range(len(state.boards))]
+    ]
@@ -0,0 +1,153 @@
+from collections import namedtuple
+
+from config import config
+
+# Immutable runtime view of config.py with every value the refresh loop needs
+# validated once and derived values precomputed.
+Settings = namedtuple('Settings', (
+    'num_trains',
+    'matrix_width',
+    'character_width',
+    'character_height',
+    'text_padding',
+    'text_color',
+    'text_color_8_car_train',
+    'text_color_scheduled',
+    'heading_text',
+    'bus_heading_text',
+    'heading_color',
+    'stale_heading_color',
+    'loading_destination_text',
+    'loading_min_text',
+    'loading_line_color',
+    'train_line_width',
+    'train_line_height',
+    'min_label_characters',
+    'destination_max_characters',
+    'bus_color',
+    'scroll_destinations',
+    'scroll_fps',
+    'scroll_gap',
+
+    # Derived values
+    'slot_y',              # Y position of each train slot
+    'destination_x',       # X position of the destination labels
+    'min_label_x',         # X position of the minutes labels
+    'destination_width',   # Width of the destination field in pixels
+    'min_label_width',     # Width of the minutes field in pixels, up to the edge of the matrix
+    'minutes_text',        # Arrival value -> right-justified minutes label text
+    'yellow_line_destination',  # Mt Vernon Square yellow line destination text, None when disabled
+    'destination_lines',   # Destination -> line code whose color overrides the train's own line
+))
+
+# Used when config.py does not set "Bus Color".
+_DEFAULT_BUS_COLOR = 0xADD8E6
+
+
+def _require_int(config: dict, key: str, minimum: int = 0) -> int:
+    value = config.get(key)
+    if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+        raise ValueError(f"config['{key}'] must be an integer of at least {minimum}, got {value!r}")
+    return value
+
+
+def _require_color(config: dict, key: str, default: int = None) -> int:
+    value = config.get(key, default)
+    if not isinstance(value, int) or not 0 <= value <= 0xFFFFFF:
+        raise ValueError(f"config['{key}'] must be a 0xRRGGBB color, got {value!r}")
+    return value
+
+
+def _require_str(config: dict, key: str) -> str:
+    value = config.get(key)
+    if not isinstance(value, str):
+        raise ValueError(f"config['{key}'] must be a string, got {value!r}")
+    return value
+
+
+def _minutes_text(width: int, extra_values: tuple) -> dict:
+    """
+    Builds the minutes label text for every arrival value the APIs send:
+    0-99 as both strings (trains) and integers (buses), plus `extra_values`.
+    """
+    table = {}
+    for minutes in range(100):
+        text = str(minutes)
+        text = ' ' * (width - len(text)) + text
+        table[minutes] = text
+        table[str(minutes)] = text
+    for value in extra_values:
+        table[value] = ' ' * (width - len(value)) + value
+    return table
+
+
+def compile_settings(config: dict) -> Settings:
+    """
+    Validates `config` and compiles it into Settings.
+    Raises ValueError naming the offending key on bad configuration.
+    """
+    num_trains = _require_int(config, 'num_trains', 1)
+    matrix_width = _require_int(config, 'matrix_width', 1)
+    character_width = _require_int(config, 'character_width', 1)
+    character_height = _require_int(config, 'character_height', 1)
+    text_padding = _require_int(config, 'text_padding')
+    train_line_width = _require_int(config, 'train_line_width', 1)
+    train_line_height = _require_int(config, 'train_line_height', 1)
+    min_label_characters = _require_int(config, 'min_label_characters', 1)
+    destination_max_characters = _require_int(config, 'destination_max_characters', 1)
+
+    heading_text = _require_str(config, 'heading_text')
+    bus_heading_text = _require_str(config, 'bus_heading_text')
+    loading_destination_text = _require_str(config, 'loading_destination_text')
+    loading_min_text = _require_str(config, 'loading_min_text')
+    if len(loading_min_text) > min_label_characters:
+        raise ValueError(f"config['loading_min_text'] must fit in {min_label_characters} characters")
+
+    destination_x = train_line_width + 2
+    min_label_x = matrix_width - (min_label_characters * character_width) + 1
+    if destination_x + destination_max_characters * character_width > min_label_x:
+        raise ValueError("config['destination_max_characters'] is too long to fit before the minutes label")
+
+    # The yellow line rewrite at Mount Vernon Square shows its trains in yellow.
+    yellow_line_destination = None
+    destination_lines = {}
+    if config.get('yellow_line_change_destination_MVSQ'):
+        yellow_line_destination = _require_str(config, 'yellow_line_change_destination_text')
+        destination_lines[yellow_line_destination] = 'YL'
+
+    return Settings(
+        num_trains=num_trains,
+        matrix_width=matrix_width,
+        character_width=character_width,
+        character_height=character_height,
+        text_padding=text_padding,
+        text_color=_require_color(config, 'text_color'),
+        text_color_8_car_train=_require_color(config, 'text_color_8_car_train'),
+        text_color_scheduled=_require_color(config, 'text_color_scheduled'),
+        heading_text=heading_text,
+        bus_heading_text=bus_heading_text,
+        heading_color=_require_color(config, 'heading_color'),
+        stale_heading_color=_require_color(config, 'stale_heading_color'),
+        loading_destination_text=loading_destination_text,
+        loading_min_text=loading_min_text,
+        loading_line_color=_require_color(config, 'loading_line_color'),
+        train_line_width=train_line_width,
+        train_line_height=train_line_height,
+        min_label_characters=min_label_characters,
+        destination_max_characters=destination_max_characters,
+        bus_color=_require_color(config, 'Bus Color', _DEFAULT_BUS_COLOR),
+        scroll_destinations=bool(config.get('scroll_destinations')),
+        scroll_fps=_require_int(config, 'scroll_fps', 1),
+        scroll_gap=_require_int(config, 'scroll_gap'),
+        slot_y=tuple((character_height + text_padding) * (i + 1) for i in range(num_trains)),
+        destination_x=destination_x,
+        min_label_x=min_label_x,
+        destination_width=destination_max_characters * character_width,
+        min_label_width=min(min_label_characters * character_width, matrix_width - min_label_x),
+        minutes_text=_minutes_text(min_label_characters, ('ARR', 'BRD', '---', '', loading_min_text)),
+        yellow_line_destination=yellow_line_destination,
+        destination_lines=destination_lines,
+    )
+
+
+settings = compile_settings(config)
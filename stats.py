@@ -0,0 +1,128 @@
+import time
+from array import array
+
+from config import config
+
+try:
+    from gc import mem_free # type: ignore
+except ImportError:
+    # Only CircuitPython reports free heap.
+    mem_free = None
+
+
+def largest_free_block(upper: int, granularity: int = 256) -> int:
+    """
+    Returns, to within `granularity` bytes, the largest block of at most `upper`
+    bytes that can be allocated, found by allocating bytearrays in a binary search.
+    A failed allocation makes the allocator collect garbage before giving up,
+    so blocks tried earlier are freed again before they could hide a larger one.
+    """
+    low = 0
+    high = upper
+    while high - low > granularity:
+        size = (low + high) // 2
+        try:
+            block = bytearray(size)
+            low = size
+        except MemoryError:
+            high = size
+        block = None
+    return low
+
+
+class RingBuffer:
+    """
+    A fixed-size buffer of float samples, allocated once up front.
+    When full, each new sample overwrites the oldest one.
+    """
+    def __init__(self, size: int):
+        self._samples = array('f', [0.0] * size)
+        self._size = size
+        self._next = 0
+        self.count = 0
+
+    def append(self, value: float):
+        self._samples[self._next] = value
+        self._next = (self._next + 1) % self._size
+        if self.count < self._size:
+            self.count += 1
+
+    def summary(self) -> tuple:
+        """
+        Returns (min, median, p95, max) over the samples held, or None when empty.
+        Sorting copies the samples, so this is only meant for on-demand dumps.
+        """
+        if not self.count:
+            return None
+        samples = sorted(self._samples[:self.count])
+        last = self.count - 1
+        return (samples[0], samples[last // 2], samples[(last * 95) // 100], samples[last])
+
+
+class Stats:
+    """
+    Lightweight timing hooks for the hot path.
+
+    Usage:
+        start = stats.now()
+        ...
+        stats.record('fetch', start)
+
+    Durations are kept in milliseconds, one preallocated RingBuffer per probe,
+    so recording never allocates. Free heap, and the largest block that can
+    still be allocated from it, are sampled with sample_memory(); comparing
+    the two over time shows the heap fragmenting.
+    """
+
+    # Probes in the order they are dumped. Transport feeds connect, first_byte
+    # and body with the phases of every request; connect only counts requests
+    # that had to open a new connection.
+    PROBES = ('fetch', 'connect', 'first_byte', 'body', 'decode', 'normalize', 'update', 'render', 'switch')
+
+    def __init__(self, size: int):
+        self._buffers = {probe: RingBuffer(size) for probe in Stats.PROBES}
+        self._memory = RingBuffer(size)
+        self._largest = RingBuffer(size)
+
+    @staticmethod
+    def now() -> int:
+        """Returns a timestamp for record(). Nanoseconds keep full precision however long the board has been up."""
+        return time.monotonic_ns()
+
+    def record(self, probe: str, start: int):
+        """Records the milliseconds elapsed since `start` under `probe`."""
+        self._buffers[probe].append((time.monotonic_ns() - start) / 1000000)
+
+    def add(self, probe: str, seconds: float):
+        """Records a duration measured elsewhere, in seconds, under `probe`."""
+        self._buffers[probe].append(seconds * 1000)
+
+    def sample_memory(self):
+        """
+        Records the current free heap and largest free block in bytes (CircuitPython only).
+        Meant to be called right after gc.collect(), when both are comparable between samples.
+        """
+        if mem_free is not None:
+            free = mem_free()
+            self._memory.append(free)
+            if config['sample_largest_free_block']:
+                self._largest.append(largest_free_block(free))
+
+    def dump(self):
+        """Prints rolling min/median/p95/max for every probe and the free heap samples."""
+        print(f'{"probe":<13} {"count":>6} {"min":>8} {"median":>8} {"p95":>8} {"max":>8}')
+        for probe in Stats.PROBES:
+            buffer = self._buffers[probe]
+            summary = buffer.summary()
+            if summary is None:
+                print(f'{probe:<13} {0:>6}')
+            else:
+                print(f'{probe + " ms":<13} {buffer.count:>6} {summary[0]:>8.1f} {summary[1]:>8.1f} {summary[2]:>8.1f} {summary[3]:>8.1f}')
+
+        for name, buffer in (('mem_free', self._memory), ('largest_free', self._largest)):
+            summary = buffer.summary()
+            if summary is not None:
+                print(f'{name:<13} {buffer.count:>6} {summary[0]:>8.0f} {summary[1]:>8.0f} {summary[2]:>8.0f} {summary[3]:>8.0f}')
+
+
+stats = Stats(config['stats_buffer_size'])
@@ -1,7 +1,6 @@
-import json
+# Checks wifiandapikey.txt through config.py, which has already read it once.
+from config import config
 
-with open('wifiandapikey.txt', 'r') as f:
-	data = json.load(f)
-	api_key = data['api_key']
-	ssid = data['ssid']
-	password = data['password']
\ No newline at end of file
+api_key = config['metro_api_key']
+ssid = config['wifi_ssid']
+password = config['wifi_password']
@@ -0,0 +1,82 @@
+import displayio
+
+from fonts import get_font
+from settings import settings
+
+try:
+    from bitmaptools import blit as _bitmaptools_blit # type: ignore
+except ImportError:
+    # Before CircuitPython 9 blitting is a Bitmap method instead.
+    _bitmaptools_blit = None
+
+# Colors text can be drawn in. A rendered text bitmap stores the index of its
+# color in TEXT_PALETTE (0 is the transparent background), so every text field
+# shares one palette and a color change means drawing a different bitmap.
+TEXT_COLORS = (settings.text_color, settings.text_color_8_car_train, settings.text_color_scheduled)
+TEXT_COLOR = 1
+TEXT_COLOR_8_CAR_TRAIN = 2
+TEXT_COLOR_SCHEDULED = 3
+
+TEXT_PALETTE = displayio.Palette(len(TEXT_COLORS) + 1)
+TEXT_PALETTE.make_transparent(0)
+for _index, _color in enumerate(TEXT_COLORS):
+    TEXT_PALETTE[_index + 1] = _color
+
+
+def blit(dest, source, x: int, y: int, x1: int, y1: int, x2: int, y2: int):
+    """Copies the source region (x1, y1)-(x2, y2) into `dest` at (x, y)."""
+    if _bitmaptools_blit is not None:
+        _bitmaptools_blit(dest, source, x, y, x1=x1, y1=y1, x2=x2, y2=y2)
+    else:
+        dest.blit(x, y, source, x1=x1, y1=y1, x2=x2, y2=y2)
+
+
+def text_width(text: str) -> int:
+    """Returns the width of `text` in pixels when drawn in the board font."""
+    font = get_font()
+    width = 0
+    for character in text:
+        glyph = font.get_glyph(ord(character))
+        if glyph is not None:
+            width += glyph.shift_x
+    return width
+
+
+def new_bitmap(width: int):
+    """Returns a blank bitmap as tall as a display row that can hold every text color."""
+    return displayio.Bitmap(max(width, 1), settings.character_height, len(TEXT_PALETTE))
+
+
+def bitmap_bytes(bitmap) -> int:
+    """Returns the heap used by the pixels of a bitmap made by new_bitmap()."""
+    # CircuitPython packs each row into 32-bit words of power of two bits per pixel.
+    bits = 1
+    while (1 << bits) < len(TEXT_PALETTE):
+        bits *= 2
+    return (bitmap.width * bits + 31) // 32 * 4 * bitmap.height
+
+
+def render_text(text: str, color_index: int = TEXT_COLOR, padding: int = 0):
+    """
+    Draws `text` into a new bitmap in the color at `color_index` of TEXT_PALETTE,
+    followed by `padding` blank columns.
+    """
+    font = get_font()
+    _, font_height, _, font_y_offset = font.get_bounding_box()
+    ascent = font_height + font_y_offset
+    height = settings.character_height
+
+    bitmap = new_bitmap(text_width(text) + padding)
+    x = 0
+    for character in text:
+        glyph = font.get_glyph(ord(character))
+        if glyph is None:
+            continue
+        # Glyph rows outside the display row are clipped.
+        top = ascent - glyph.height - glyph.dy
+        for row in range(max(0, -top), min(glyph.height, height - top)):
+            for column in range(glyph.width):
+                if glyph.bitmap[column, row]:
+                    bitmap[x + glyph.dx + column, top + row] = color_index
+        x += glyph.shift_x
+    return bitmap
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+
+from config import config
+from text_bitmap import bitmap_bytes, render_text
+
+
+class TextCache:
+    """
+    A least recently used cache of rendered text bitmaps, keyed by text and
+    color index.
+
+    A station only ever shows a handful of destinations and minute values, so
+    most text fields are drawn by blitting a bitmap from here instead of
+    laying the text out glyph by glyph again. The cache holds at most
+    `max_bytes` of bitmap pixels; the least recently used bitmaps are dropped
+    first, although the one just rendered is always kept.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._bitmaps = OrderedDict()
+        # Heap used by the cached bitmaps' pixels.
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text: str, color_index: int, padding: int = 0):
+        """
+        Returns the bitmap of `text` in `color_index`, rendering it on a miss.
+        Callers must always use the same `padding` for the same text.
+        """
+        key = (text, color_index)
+        bitmap = self._bitmaps.pop(key, None)
+        if bitmap is not None:
+            # Re-inserting moves the bitmap to the most recently used end.
+            self._bitmaps[key] = bitmap
+            self.hits += 1
+            return bitmap
+
+        self.misses += 1
+        bitmap = render_text(text, color_index, padding)
+        self._bitmaps[key] = bitmap
+        self.bytes += bitmap_bytes(bitmap)
+        while self.bytes > self.max_bytes and len(self._bitmaps) > 1:
+            oldest = next(iter(self._bitmaps))
+            self.bytes -= bitmap_bytes(self._bitmaps.pop(oldest))
+            self.evictions += 1
+        return bitmap
+
+    def clear(self):
+        self._bitmaps.clear()
+        self.bytes = 0
+
+    def hit_rate(self) -> float:
+        """Returns the fraction of lookups served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def dump(self):
+        """Prints the hit rate and memory use."""
+        print(
+            f'text cache: {len(self._bitmaps)} bitmaps, {self.bytes}/{self.max_bytes} bytes, '
+            f'{self.hits} hits, {self.misses} misses ({self.hit_rate() * 100:.0f}% hit rate), '
+            f'{self.evictions} evictions'
+        )
+
+
+text_cache = TextCache(config['text_cache_bytes'])
@@ -0,0 +1,242 @@
+import time
+
+import clock
+from config import config
+from quota import quota
+from receive_buffer import receive_buffer
+from stats import stats
+
+# Both are created on first use so importing the API modules stays cheap
+# and the ESP32 coprocessor is only brought up once.
+_network = None
+_transport = None
+
+
+class Transport:
+    """
+    HTTP transport shared by MetroApi and BusApi.
+
+    Wraps a single adafruit_requests Session. The session keeps sockets open
+    after a response has been read and closed, so consecutive requests to
+    api.wmata.com reuse the same connection instead of repeating the TLS
+    handshake. Any socket pool with the CPython `socket` interface works,
+    which allows running against a local HTTP server on a host.
+
+    Timing of the last request is kept in `last_timing`, in seconds:
+        'connect'    - opening a new socket, including the TLS handshake (0 when reused)
+        'first_byte' - sending the request until the response headers are parsed
+        'body'       - reading the body until the response is closed
+        'total'      - the whole request
+    and every request's phases are recorded as stats probes of the same names.
+    """
+    def __init__(self, socket_pool, ssl_context=None):
+        import adafruit_requests # type: ignore
+
+        if ssl_context is not None:
+            ssl_context = _TimedSSLContext(ssl_context, self)
+        self._session = adafruit_requests.Session(_TimedSocketPool(socket_pool, self), ssl_context)
+
+        # Number of requests made and new connections opened for them.
+        self.requests = 0
+        self.connections = 0
+
+        self.last_timing = {
+            'connect': 0.0,
+            'first_byte': 0.0,
+            'body': 0.0,
+            'total': 0.0,
+            'reused': False
+        }
+        self._connect_time = 0.0
+
+    def get(self, url: str, headers: dict = None):
+        """
+        Sends a GET request and returns the response once its headers are read.
+        The response must be closed (after reading the body) to return the
+        connection to the session for reuse. The request is counted against
+        the API quota; callers wait out quota.wait_time() first.
+        """
+        quota.acquire()
+        self.requests += 1
+        connections = self.connections
+        self._connect_time = 0.0
+
+        start = time.monotonic()
+        response = self._session.get(url, headers=headers, timeout=config['http_timeout'])
+        headers_done = time.monotonic()
+        if clock.needs_sync():
+            # Signs have no clock of their own; WMATA's Date header sets it.
+            clock.sync(response.headers.get('date'))
+
+        timing = self.last_timing
+        timing['connect'] = self._connect_time
+        timing['first_byte'] = headers_done - start - self._connect_time
+        timing['reused'] = self.connections == connections
+        return _TimedResponse(response, self._session, timing, start, headers_done)
+
+    def dump(self):
+        """Prints how many requests were made and how many connections they opened."""
+        timing = self.last_timing
+        connect = 'reused its connection' if timing['reused'] else f'connected in {timing["connect"] * 1000:.0f} ms'
+        print(
+            f'transport: {self.requests} requests over {self.connections} connections, last request {connect}, '
+            f'first byte {timing["first_byte"] * 1000:.0f} ms, body {timing["body"] * 1000:.0f} ms'
+        )
+
+
+class _TimedResponse:
+    """
+    Forwards to an adafruit_requests Response and records body timing on close.
+    Closing it reads whatever the caller left of the body, so the socket goes
+    back to the session positioned at the next response.
+    """
+    def __init__(self, response, session, timing: dict, start: float, headers_done: float):
+        self._response = response
+        self._session = session
+        self._timing = timing
+        self._start = start
+        self._headers_done = headers_done
+        self._chunks = None
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def readinto(self, buffer) -> int:
+        """Reads the next part of the body into `buffer`. Returns the bytes read, 0 at the end of the body."""
+        # adafruit_requests 2.x to 4.x read the body with Response._readinto();
+        # it is not public, so fall back to iter_content() (which copies every
+        # chunk) should a release drop it.
+        readinto = getattr(self._response, '_readinto', None)
+        if readinto is not None:
+            return readinto(buffer)
+        if self._chunks is None:
+            self._chunks = self._response.iter_content(chunk_size=len(buffer))
+        chunk = next(self._chunks, b'')
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    def close(self):
+        # The decoders stop reading once they have what they need and error
+        # responses are closed unread. Unread bytes left on a pooled socket
+        # would be parsed as the next response's headers, so drain them.
+        sock = self._response.socket
+        if sock is not None:
+            # Without a Content-Length or chunking the body ends when the
+            # server hangs up; that socket cannot be reused anyway.
+            reusable = getattr(self._response, '_remaining', 0) is not None or getattr(self._response, '_chunked', False)
+            if reusable:
+                try:
+                    receive_buffer.drain(self)
+                except OSError:
+                    reusable = False
+            if not reusable:
+                self._session._connection_manager.close_socket(sock)
+                self._response.socket = None
+        self._response.close()
+        end = time.monotonic()
+        timing = self._timing
+        timing['body'] = end - self._headers_done
+        timing['total'] = end - self._start
+        if not timing['reused']:
+            stats.add('connect', timing['connect'])
+        stats.add('first_byte', timing['first_byte'])
+        stats.add('body', timing['body'])
+
+
+class _TimedSocketPool:
+    """Socket pool wrapper whose sockets time their connect calls."""
+    def __init__(self, socket_pool, transport: Transport):
+        self._socket_pool = socket_pool
+        self._transport = transport
+
+    def __getattr__(self, name):
+        return getattr(self._socket_pool, name)
+
+    def socket(self, *args, **kwargs):
+        return _TimedSocket(self._socket_pool.socket(*args, **kwargs), self._transport)
+
+
+class _TimedSSLContext:
+    """SSL context wrapper that keeps wrapped sockets timed."""
+    def __init__(self, ssl_context, transport: Transport):
+        self._ssl_context = ssl_context
+        self._transport = transport
+
+    def wrap_socket(self, sock, **kwargs):
+        if isinstance(sock, _TimedSocket):
+            sock = sock._socket
+        return _TimedSocket(self._ssl_context.wrap_socket(sock, **kwargs), self._transport)
+
+
+class _TimedSocket:
+    """
+    Socket wrapper timing connect(). Both the ESP32 coprocessor and CPython's
+    ssl module perform the TLS handshake inside connect(), so this covers it.
+    """
+    def __init__(self, sock, transport: Transport):
+        self._socket = sock
+        self._transport = transport
+
+    def __getattr__(self, name):
+        return getattr(self._socket, name)
+
+    def connect(self, *args):
+        start = time.monotonic()
+        result = self._socket.connect(*args)
+        self._transport._connect_time += time.monotonic() - start
+        self._transport.connections += 1
+        return result
+
+
+def get_network():
+    """Returns the shared MatrixPortal Network, creating it on first use."""
+    global _network
+    if _network is None:
+        import board # type: ignore
+        from adafruit_matrixportal.network import Network # type: ignore
+        _network = Network(status_neopixel=board.NEOPIXEL)
+    return _network
+
+
+def _get_socket_pool():
+    """Connects to WiFi and returns the ESP32 socket pool and the ESP32 it talks to."""
+    import adafruit_connection_manager # type: ignore
+
+    network = get_network()
+    network.connect()
+
+    esp = network._wifi.esp
+    return adafruit_connection_manager.get_radio_socketpool(esp), esp
+
+
+def get_transport() -> Transport:
+    """
+    Returns the shared Transport, connecting to WiFi and building it on first use.
+    It talks to the ESP32 coprocessor of the shared Network directly.
+    """
+    global _transport
+    if _transport is None:
+        import adafruit_connection_manager # type: ignore
+
+        socket_pool, esp = _get_socket_pool()
+        # The coprocessor does TLS itself; this context just asks it to.
+        _transport = Transport(socket_pool, adafruit_connection_manager.get_radio_ssl_context(esp))
+    return _transport
+
+
+def dump_transport():
+    """Prints the shared Transport's requests and connections, once it has been built."""
+    if _transport is not None:
+        _transport.dump()
+
+
+def get_udp_socket(host: str, port: int):
+    """
+    Returns a non-blocking UDP socket connected to host:port through the ESP32
+    coprocessor, connecting to WiFi first if needed.
+    """
+    socket_pool, esp = _get_socket_pool()
+    sock = socket_pool.socket(type=socket_pool.SOCK_DGRAM)
+    sock.connect((host, port), esp.UDP_MODE)
+    sock.settimeout(0)
+    return sock